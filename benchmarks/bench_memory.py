@@ -0,0 +1,42 @@
+"""Compare the memory used per brick by the BrickTable with one dict per brick
+
+Usage: python benchmarks/bench_memory.py [width_mm] [height_mm]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from wall_engine import BondType, generate_wall
+
+def main():
+    width_mm = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    height_mm = int(sys.argv[2]) if len(sys.argv) > 2 else 15000
+
+    wall = generate_wall(width_mm, height_mm, BondType.NORMAL)
+    bricks = wall.bricks
+    count = len(bricks)
+
+    # The dictionary layout every brick used to have
+    tracemalloc.start()
+    dicts = [
+        {
+            'id': i,
+            'type': bricks.brick_type(i),
+            'x_mm': bricks.x_mm(i),
+            'y_mm': bricks.y_mm(i),
+            'width_mm': bricks.width_mm(i),
+        }
+        for i in range(count)
+    ]
+    dict_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del dicts
+
+    print(f"{width_mm}x{height_mm}mm NORMAL wall, {count} bricks")
+    print(f"BrickTable:     {bricks.nbytes() / count:6.1f} bytes per brick")
+    print(f"dict per brick: {dict_bytes / count:6.1f} bytes per brick")
+
+if __name__ == "__main__":
+    main()
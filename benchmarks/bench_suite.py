@@ -0,0 +1,154 @@
+"""Benchmark generation, build ordering and rendering against saved baselines
+
+Every bond is timed on walls from the default 2300x2000 mm up to 50x15 m:
+generate_wall, calculate_build_order on the generated wall, a build_next_brick
+sweep over the whole build order and draw_wall onto an off-screen surface with
+the dummy SDL video driver, with the view fitted to each wall like the viewer does. Peak memory of generate_wall is measured in a
+separate tracemalloc run, so tracing doesn't slow down the timings.
+
+Usage: python benchmarks/bench_suite.py [--bond NAME] [--size WxH] [--repeats N]
+                                        [--baseline FILE] [--save] [--tolerance F]
+
+Without --save the results are compared with the baseline file. The run exits with
+status 1 when a timing is more than tolerance slower than its baseline (default 1.0,
+so twice as slow) or peak memory is more than 10% higher; timings within 5 ms of
+their baseline always pass. A case that looks slower is measured once more and keeps
+its best timings, so a busy moment on the machine doesn't fail the run. Timings only
+compare on the machine the baseline was saved on.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+from wall_engine import BondType, calculate_build_order, generate_wall
+
+try:
+    import pygame
+    import brick_layer_simulator as viewer
+except ImportError:
+    pygame = None
+
+SIZES = ((2300, 2000), (8000, 3000), (20000, 10000), (50000, 15000))
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+MEMORY_TOLERANCE = 0.1
+TIMING_SLACK_S = 0.005  # Timer noise on the smallest walls
+
+def best_time(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def build_sweep(wall):
+    """Build every brick through the viewer, like pressing ENTER until the wall is done"""
+    viewer.wall = wall
+    viewer.built_bricks = bytearray(len(wall.bricks))
+    viewer.build_cursor = 0
+    while viewer.build_next_brick():
+        pass
+
+def run_case(bond_type, width_mm, height_mm, repeats, draw):
+    results = {}
+    results['generate_wall_s'] = best_time(lambda: generate_wall(width_mm, height_mm, bond_type, seed=1), repeats)
+    wall = generate_wall(width_mm, height_mm, bond_type, seed=1)
+    results['calculate_build_order_s'] = best_time(lambda: calculate_build_order(wall), repeats)
+
+    if draw:
+        # Fit the view and the surface to this wall, so every brick lands on the surface
+        viewer.configure_view(wall.spec)
+        surface = pygame.Surface((viewer.screen_width, viewer.screen_height))
+        results['build_sweep_s'] = best_time(lambda: build_sweep(wall), repeats)
+        # Half of the bricks built, so both brick colours are drawn
+        viewer.built_bricks = bytearray(len(wall.bricks))
+        for brick_id in wall.build_order[:len(wall.build_order) // 2]:
+            viewer.built_bricks[brick_id] = 1
+        results['draw_wall_s'] = best_time(lambda: viewer.draw_wall(surface), repeats)
+
+    tracemalloc.start()
+    generate_wall(width_mm, height_mm, bond_type, seed=1)
+    _, results['generate_wall_peak_bytes'] = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results['bricks'] = len(wall.bricks)
+    return results
+
+def regressions(name, results, baseline, tolerance):
+    """Descriptions of every metric of a case that got worse than its baseline allows"""
+    found = []
+    for metric, value in results.items():
+        reference = baseline.get(metric)
+        if reference is None or metric == 'bricks':
+            continue
+        if metric.endswith('_bytes'):
+            regressed = value > reference * (1 + MEMORY_TOLERANCE)
+        else:
+            regressed = value > reference * (1 + tolerance) and value > reference + TIMING_SLACK_S
+        if regressed:
+            found.append(f"{name} {metric}: {value:.6g} against a baseline of {reference:.6g}")
+    return found
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bond', choices=[bond.name for bond in BondType], action='append',
+                        help="only benchmark this bond, can be repeated")
+    parser.add_argument('--size', action='append', help="only benchmark this WIDTHxHEIGHT in mm, can be repeated")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="allowed slowdown, as a fraction")
+    args = parser.parse_args(argv)
+
+    bonds = [BondType[name] for name in args.bond] if args.bond else list(BondType)
+    sizes = [tuple(int(value) for value in size.split('x')) for size in args.size] if args.size else SIZES
+
+    draw = pygame is not None
+    if draw:
+        pygame.display.init()
+    else:
+        print("pygame is not installed, skipping the viewer benchmarks", file=sys.stderr)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baselines = json.load(file)['cases']
+
+    results = {}
+    failures = []
+    for bond_type in bonds:
+        for width_mm, height_mm in sizes:
+            name = f"{bond_type.name} {width_mm}x{height_mm}"
+            case = run_case(bond_type, width_mm, height_mm, args.repeats, draw)
+            if not args.save and regressions(name, case, baselines.get(name, {}), args.tolerance):
+                retry = run_case(bond_type, width_mm, height_mm, args.repeats, draw)
+                case = {metric: min(value, retry[metric]) for metric, value in case.items()}
+            results[name] = case
+            timings = ", ".join(f"{metric[:-2]} {value * 1000:.1f} ms"
+                                for metric, value in case.items() if metric.endswith('_s'))
+            print(f"{name}: {case['bricks']} bricks, {timings}, "
+                  f"peak {case['generate_wall_peak_bytes'] / 2**20:.1f} MiB")
+            if not args.save and name in baselines:
+                failures += regressions(name, case, baselines[name], args.tolerance)
+
+    if args.save:
+        baselines.update(results)
+        with open(args.baseline, 'w') as file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'cases': baselines},
+                      file, indent=2, sort_keys=True)
+            file.write('\n')
+        print(f"Saved the baseline to {args.baseline}")
+        return 0
+
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
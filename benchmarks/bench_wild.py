@@ -0,0 +1,29 @@
+"""Time WILD bond generation on large walls
+
+Usage: python benchmarks/bench_wild.py [width_mm] [height_mm] [repeats]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from wall_engine import BondType, generate_wall
+
+def main():
+    width_mm = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    height_mm = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    repeats = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    timings = []
+    for seed in range(repeats):
+        start = time.perf_counter()
+        wall = generate_wall(width_mm, height_mm, BondType.WILD, seed=seed)
+        timings.append(time.perf_counter() - start)
+
+    bricks = len(wall.bricks)
+    print(f"WILD {width_mm}x{height_mm}mm, {wall.num_layers} courses, {bricks} bricks")
+    print(f"best {min(timings):.3f}s, mean {sum(timings) / len(timings):.3f}s over {repeats} runs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Bond quality analysis of whole walls, whatever bond they were laid in
+
+Usage: python bond_quality.py WALL_FILE... [--max-length N] [--verbose]
+
+The WILD generator only checks the joints it is choosing between, and NORMAL and
+FLEMISH walls are never checked at all. analyze_wall scans every head joint of a
+finished wall, a Wall or a WallFile, for the patterns the WILD generator avoids:
+falling teeth and staggering left or right runs of more than MAX_PATTERN_LENGTH
+courses below the joint, measured like check_pattern_type does.
+
+Every course is turned into a bitset of the right edges of its bricks, so a run
+of pattern offsets across courses becomes a handful of shifts and ands per course
+instead of a walk per joint. Only the joints that turn out to be violations are
+followed down their chain to measure it.
+
+The head joint after the lead brick of a course (or of a stretch next to an
+opening) is set by the bond rules and lines up from course to course in every
+bond, so it is not checked. It can still be part of a chain.
+"""
+import argparse
+import json
+import math
+import sys
+from collections import namedtuple
+
+from wall_engine import MAX_PATTERN_LENGTH, PATTERN_TYPES, to_mm
+from wall_file import WallFile
+
+# A head joint that tops a chain longer than the allowed pattern length, length counts the courses below it
+PatternViolation = namedtuple('PatternViolation', 'layer joint_mm pattern_type length')
+
+class BondReport:
+    """Pattern violations of one wall"""
+
+    def __init__(self, courses, joints_checked, violations, max_length):
+        self.courses = courses
+        self.joints_checked = joints_checked
+        self.violations = violations  # PatternViolations, course by course from the bottom
+        self.max_length = max_length
+
+    @property
+    def ok(self):
+        return not self.violations
+
+    def counts(self):
+        """Number of violations per pattern type"""
+        counts = dict.fromkeys(PATTERN_TYPES, 0)
+        for violation in self.violations:
+            counts[violation.pattern_type] += 1
+        return counts
+
+    def longest(self):
+        return max((violation.length for violation in self.violations), default=0)
+
+    def as_dict(self):
+        return {
+            'courses': self.courses,
+            'joints_checked': self.joints_checked,
+            'max_length': self.max_length,
+            'violations': len(self.violations),
+            'violations_by_type': self.counts(),
+            'longest': self.longest(),
+        }
+
+def course_bricks(wall):
+    """(x, width) in tenths of a mm of the bricks of every course, left to right, for a Wall or a WallFile"""
+    if isinstance(wall, WallFile):
+        return [wall.course_bricks(layer) for layer in range(wall.num_layers)]
+    bricks = wall.bricks
+    lengths = bricks.lengths_by_code
+    courses = [[] for _ in range(wall.num_layers)]
+    for x, type_code, layer in zip(bricks.x_tenths, bricks.type_code, bricks.layer):
+        courses[layer].append((x, lengths[type_code]))
+    for course in courses:
+        course.sort()
+    return courses
+
+def _joint_bitsets(courses, head_joint, unit):
+    """Bitsets of every course: the right edges of all bricks and the head joints to check, bit i at i * unit"""
+    edges = []
+    checked = []
+    for course in courses:
+        edge_bits = 0
+        checked_bits = 0
+        lead = True  # The next head joint follows the lead brick of a stretch
+        for index, (x, width) in enumerate(course):
+            right = x + width
+            edge_bits |= 1 << (right // unit)
+            next_brick = course[index + 1] if index + 1 < len(course) else None
+            if next_brick is not None and next_brick[0] == right + head_joint:
+                if not lead:
+                    checked_bits |= 1 << (right // unit)
+                lead = False
+            else:
+                # An opening or the end of the wall, the next brick leads again
+                lead = True
+        edges.append(edge_bits)
+        checked.append(checked_bits)
+    return edges, checked
+
+def _bit_indices(bits):
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+def _chain_length(edges, layer, pos, step, alternate, memo):
+    """Courses from layer downwards that continue a chain, like wall_engine._chain_length on bit indices"""
+    path = []
+    length = 0
+    while layer >= 0:
+        key = (layer, pos, step, alternate)
+        cached = memo.get(key)
+        if cached is not None:
+            length = cached
+            break
+        if pos < 0 or not edges[layer] >> pos & 1:
+            memo[key] = 0
+            break
+        path.append(key)
+        if alternate:
+            pos, step = step, pos
+        else:
+            pos += step
+        layer -= 1
+    for key in reversed(path):
+        length += 1
+        memo[key] = length
+    return length
+
+def analyze_courses(courses, head_joint, pattern_offset, max_length=MAX_PATTERN_LENGTH):
+    """Scan courses of (x, width) bricks in tenths of a mm for patterns longer than max_length, see analyze_wall"""
+    positions = [value for course in courses for x, width in course for value in (x, x + width)]
+    # Bits only need to be as fine as the positions that occur, which keeps the bitsets short
+    unit = math.gcd(pattern_offset, head_joint, *positions) or 1
+    offset = pattern_offset // unit
+    edges, checked = _joint_bitsets(courses, head_joint, unit)
+    reach = max_length + 1  # Courses below a joint that make a violation
+
+    violations = []
+    memo = {}
+    for layer in range(reach, len(courses)):
+        candidates = checked[layer]
+        if not candidates:
+            continue
+        below = edges[layer - reach:layer][::-1]  # below[k] is the course k + 1 under this one
+
+        # A right stagger has its joints k offsets to the right k courses down, so its
+        # course below is shifted left by k offsets onto the joint's bit, and vice versa
+        right = left = candidates
+        for k, course in enumerate(below, 1):
+            right &= course >> (k * offset)
+            left &= course << (k * offset)
+
+        # Falling teeth alternate between the joint and one offset next to it, the left offset wins
+        teeth_left = teeth_right = candidates
+        for k, course in enumerate(below, 1):
+            if k % 2:
+                teeth_left &= course << offset
+                teeth_right &= course >> offset
+            else:
+                teeth_left &= course
+                teeth_right &= course
+        teeth_right &= ~(below[0] << offset)
+
+        found = []
+        for bit in _bit_indices(teeth_left):
+            found.append((bit, 'falling_teeth', _chain_length(edges, layer - 1, bit - offset, bit, True, memo)))
+        for bit in _bit_indices(teeth_right):
+            found.append((bit, 'falling_teeth', _chain_length(edges, layer - 1, bit + offset, bit, True, memo)))
+        for bit in _bit_indices(left):
+            found.append((bit, 'staggering_left', _chain_length(edges, layer - 1, bit - offset, -offset, False, memo)))
+        for bit in _bit_indices(right):
+            found.append((bit, 'staggering_right', _chain_length(edges, layer - 1, bit + offset, offset, False, memo)))
+        found.sort()
+        violations += [PatternViolation(layer, to_mm(bit * unit), pattern_type, length)
+                       for bit, pattern_type, length in found]
+
+    joints_checked = sum(bits.bit_count() for bits in checked)
+    return BondReport(len(courses), joints_checked, violations, max_length)
+
+def analyze_wall(wall, max_length=MAX_PATTERN_LENGTH):
+    """Scan every head joint of a Wall or WallFile for patterns of more than max_length courses.
+
+    Chains are measured like check_pattern_type measures them while a WILD wall is
+    generated: joints exactly one pattern offset apart from course to course.
+    """
+    catalogue = wall.catalogue
+    return analyze_courses(course_bricks(wall), catalogue.head_joint_tenths, catalogue.pattern_offset_tenths,
+                           max_length)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('walls', nargs='+', help="wall files, see wall_file.py")
+    parser.add_argument('--max-length', type=int, default=MAX_PATTERN_LENGTH,
+                        help="courses a pattern may run below a joint")
+    parser.add_argument('--verbose', action='store_true', help="also list every violation")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.walls:
+        with WallFile(path) as wall:
+            report = analyze_wall(wall, args.max_length)
+            summary = {'wall': path, 'bond': wall.bond_type.name, 'seed': wall.seed, **report.as_dict()}
+        if args.verbose:
+            summary['violation_list'] = [violation._asdict() for violation in report.violations]
+        print(json.dumps(summary))
+        failed += not report.ok
+    if failed:
+        print(f"{failed} of {len(args.walls)} walls have pattern violations", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
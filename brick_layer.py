@@ -0,0 +1,249 @@
+"""Command line tools for planning walls without the viewer
+
+Usage: python brick_layer.py plan MANIFEST.jsonl --output-dir DIR [--workers N] [--format jsonl|csv|binary]
+                                [--cache-dir DIR] [--save-walls] [--stats] [--profile] [--check-bond]
+                                [--take-off] [--saw-kerf MM] [--log-level LEVEL]
+       python brick_layer.py building BUILDING.json --output-dir DIR [same options as plan]
+
+Every line of the manifest is a JSON object describing one wall, for example
+{"name": "north", "width_mm": 8000, "height_mm": 2600, "bond": "WILD", "seed": 3, "stride_width": 800}.
+"openings" is a list of [x_mm, y_mm, width_mm, height_mm] rectangles and "catalogue"
+an object with BrickCatalogue fields, for example {"full_length": 240, "height": 71}.
+Walls are generated in a process pool. Each wall's build order is written to
+DIR/<name>.<format>, and a summary line per wall is appended to DIR/summary.jsonl
+as soon as that wall is done. With --save-walls every wall is also saved as
+DIR/<name>.wall, see wall_file.py. --stats adds each generated wall's timers and
+counters to its summary, walls loaded from the cache have none. --profile writes
+a cProfile dump per wall to DIR/<name>.prof.
+--check-bond adds the bond quality report of every wall, see bond_quality.py.
+--take-off writes the pallet lists and cutting plans of every wall to
+DIR/<name>.takeoff.json, adds its totals to the summary and writes the totals of
+all walls to DIR/takeoff.json when planning finishes, see take_off.py.
+
+A building file is a JSON object with the walls of a building as manifest entries
+and the corners where they meet, see building.py:
+{"walls": [{"name": "north", ...}, {"name": "east", ...}], "corners": [[["north", "end"], ["east", "start"]]]}.
+The corners are solved first, then the walls are planned like a manifest.
+"""
+import argparse
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bond_quality import analyze_wall
+from build_export import WRITERS, export_build_order
+from building import solve_corners, wall_spec_from_options
+from take_off import SAW_KERF, project_take_off, wall_take_off
+from wall_cache import cached_generate_wall, process_cache
+from wall_file import save_wall
+from wall_engine import BondType, BrickCatalogue, Corner, Opening, brick_counts, build_order_stats
+
+FILE_EXTENSIONS = {'csv': 'csv', 'jsonl': 'jsonl', 'binary': 'bin'}
+
+# Manifest keys that are passed on to generate_wall as they are
+WALL_OPTIONS = (
+    'width_mm', 'height_mm', 'seed', 'stride_width', 'stride_height',
+    'solver', 'beam_width', 'time_budget', 'planner', 'objective', 'reach_margin', 'course_offset',
+)
+# Manifest keys that are converted before they are passed on
+CONVERTED_OPTIONS = ('name', 'bond', 'openings', 'catalogue', 'corners')
+
+def read_manifest(file):
+    """Read wall specs from a JSON lines file, naming the walls that have no name"""
+    specs = []
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        spec = json.loads(line)
+        spec.setdefault('name', f"wall-{len(specs):04d}")
+        _check_spec(spec, f"Line {line_number}")
+        specs.append(spec)
+    return specs
+
+def _check_spec(spec, where):
+    unknown = set(spec) - set(WALL_OPTIONS) - set(CONVERTED_OPTIONS)
+    if unknown:
+        raise ValueError(f"{where}: unknown wall options {sorted(unknown)}")
+
+def read_building(file):
+    """Read a building file and return its walls as manifest specs with their corners solved"""
+    building = json.load(file)
+    specs = building.get('walls', [])
+    for index, spec in enumerate(specs):
+        if 'name' not in spec:
+            raise ValueError(f"Wall {index}: walls of a building need a name to be part of a corner")
+        _check_spec(spec, f"Wall {spec['name']}")
+    corners = [tuple(tuple(wall_end) for wall_end in corner) for corner in building.get('corners', [])]
+    solved = solve_corners({spec['name']: wall_spec_from_options(wall_options(spec)) for spec in specs}, corners)
+    for spec in specs:
+        course_offset, wall_corners = solved[spec['name']]
+        spec['course_offset'] = course_offset
+        spec['corners'] = [None if corner is None else list(corner) for corner in wall_corners]
+    return specs
+
+def wall_options(spec):
+    options = {key: spec[key] for key in WALL_OPTIONS if key in spec}
+    if 'bond' in spec:
+        options['bond_type'] = BondType[spec['bond']]
+    if 'openings' in spec:
+        options['openings'] = [Opening(*opening) for opening in spec['openings']]
+    if 'catalogue' in spec:
+        options['catalogue'] = BrickCatalogue(**spec['catalogue'])
+    if 'corners' in spec:
+        options['corners'] = tuple(None if corner is None else Corner(*corner) for corner in spec['corners'])
+    return options
+
+def plan_wall(spec, output_dir, fmt='jsonl', cache_dir=None, save_walls=False, stats=False, profile=False,
+              check_bond=False, take_off=False, saw_kerf=SAW_KERF):
+    """Generate one wall, or load it from the cache in cache_dir, write its build order and return its summary"""
+    cache = process_cache(cache_dir) if cache_dir is not None else None
+    hits = cache.hits if cache is not None else 0
+    profiler = cProfile.Profile() if profile else None
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    wall = cached_generate_wall(cache, **wall_options(spec), instrument=stats)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(os.path.join(output_dir, f"{spec['name']}.prof"))
+    generation_time = time.perf_counter() - start
+    cache_hit = cache is not None and cache.hits > hits
+
+    path = os.path.join(output_dir, f"{spec['name']}.{FILE_EXTENSIONS[fmt]}")
+    binary = fmt == 'binary'
+    with open(path, 'wb' if binary else 'w', newline=None if binary else '') as file:
+        export_build_order(wall, file, fmt)
+    if save_walls:
+        save_wall(wall, os.path.join(output_dir, f"{spec['name']}.wall"))
+
+    summary = {
+        'name': spec['name'],
+        'bond': wall.bond_type.name,
+        'seed': wall.seed,
+        'bricks': len(wall.bricks),
+        'bricks_by_type': {brick_type.name: count for brick_type, count in brick_counts(wall).items()},
+        'problematic_joints': wall.problematic_joint_count,
+        **build_order_stats(wall),
+        'cache_hit': cache_hit,
+        'generation_time_s': round(generation_time, 6),
+        'total_time_s': round(time.perf_counter() - start, 6),
+        'output': path,
+    }
+    if stats and not cache_hit:
+        # A wall loaded from the cache wasn't generated, so it has no timers or counters
+        summary['stats'] = wall.stats.as_dict()
+    if check_bond:
+        summary['bond_quality'] = analyze_wall(wall).as_dict()
+    if take_off:
+        report = wall_take_off(wall, saw_kerf)
+        with open(os.path.join(output_dir, f"{spec['name']}.takeoff.json"), 'w') as file:
+            json.dump(report.as_dict(pallets=True), file)
+        summary['take_off'] = report.as_dict()
+    return summary
+
+def _configure_logging(level):
+    logging.basicConfig(level=level, format="%(processName)s %(name)s: %(message)s")
+
+def plan_manifest(specs, output_dir, fmt='jsonl', max_workers=None, cache_dir=None, save_walls=False,
+                  stats=False, profile=False, check_bond=False, take_off=False, saw_kerf=SAW_KERF,
+                  log_level=logging.WARNING):
+    """Plan every wall in a process pool, yielding summaries in the order walls finish.
+
+    A wall that fails yields a summary with its name and the error instead of
+    stopping the batch.
+    """
+    names = [spec['name'] for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Wall names in a manifest must be unique")
+    os.makedirs(output_dir, exist_ok=True)
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_configure_logging, initargs=(log_level,)) as executor:
+        futures = {
+            executor.submit(plan_wall, spec, output_dir, fmt, cache_dir, save_walls, stats, profile, check_bond,
+                            take_off, saw_kerf): spec
+            for spec in specs
+        }
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as error:
+                yield {'name': futures[future]['name'], 'error': f"{type(error).__name__}: {error}"}
+
+def plan_command(args):
+    with open(args.manifest) as file:
+        specs = read_manifest(file)
+    return _plan_specs(specs, args)
+
+def building_command(args):
+    with open(args.building) as file:
+        specs = read_building(file)
+    return _plan_specs(specs, args)
+
+def _plan_specs(specs, args):
+    start = time.perf_counter()
+    failed = 0
+    take_offs = []
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(os.path.join(args.output_dir, 'summary.jsonl'), 'w') as summary_file:
+        for summary in plan_manifest(specs, args.output_dir, args.format, args.workers, args.cache_dir,
+                                     args.save_walls, args.stats, args.profile, args.check_bond, args.take_off,
+                                     args.saw_kerf, args.log_level):
+            summary_file.write(json.dumps(summary) + '\n')
+            summary_file.flush()
+            if 'error' in summary:
+                failed += 1
+                print(f"{summary['name']}: {summary['error']}", file=sys.stderr)
+            else:
+                if 'take_off' in summary:
+                    take_offs.append(summary['take_off'])
+                if args.verbose:
+                    print(f"{summary['name']}: {summary['bricks']} bricks in {summary['total_time_s']:.3f}s",
+                          file=sys.stderr)
+
+    if args.take_off:
+        project = project_take_off(take_offs)
+        with open(os.path.join(args.output_dir, 'takeoff.json'), 'w') as file:
+            json.dump(project, file)
+        print(f"Take-off: {project['full_bricks']} full bricks, {project['saw_cuts']} saw cuts, "
+              f"{project['waste_mm'] / 1000:.1f} m of waste", file=sys.stderr)
+
+    print(f"Planned {len(specs) - failed} of {len(specs)} walls in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='brick-layer', description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    plan = subparsers.add_parser('plan', help="generate the walls of a manifest and their build orders")
+    plan.add_argument('manifest', help="JSON lines file with one wall spec per line")
+    plan.set_defaults(handler=plan_command)
+    building = subparsers.add_parser('building', help="generate the walls of a building, interlocking at the corners")
+    building.add_argument('building', help="JSON file with the walls of a building and their corners")
+    building.set_defaults(handler=building_command)
+
+    for command in (plan, building):
+        command.add_argument('--output-dir', required=True)
+        command.add_argument('--format', choices=sorted(WRITERS), default='jsonl')
+        command.add_argument('--workers', type=int, help="worker processes, all cores by default")
+        command.add_argument('--cache-dir', help="reuse walls generated with the same options from this directory")
+        command.add_argument('--save-walls', action='store_true', help="also save every wall as <name>.wall")
+        command.add_argument('--stats', action='store_true', help="add generation timers and counters to the summaries")
+        command.add_argument('--profile', action='store_true', help="write a cProfile dump per wall to <name>.prof")
+        command.add_argument('--check-bond', action='store_true',
+                             help="add a bond quality report of every wall to the summaries")
+        command.add_argument('--take-off', action='store_true',
+                             help="write pallet lists and cutting plans to <name>.takeoff.json and takeoff.json")
+        command.add_argument('--saw-kerf', type=float, default=SAW_KERF, help="mm lost per saw cut for --take-off")
+        command.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='WARNING',
+                             help="DEBUG reports every problematic joint pattern")
+        command.add_argument('--verbose', action='store_true', help="report every finished wall")
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,42 +1,28 @@
+import argparse
+import asyncio
+import math
 import pygame
 import sys
-import math
-import random
-from enum import Enum
-
-# Brick and wall dimensions
-FULL_BRICK_LENGTH = 210
-DRIEKLEZOOR_LENGTH = 155
-HALF_BRICK_LENGTH = 100
-FULL_BRICK_WIDTH = 100
-BRICK_HEIGHT = 50
-HEAD_JOINT = 10  # Vertical joint
-BED_JOINT = 12.5  # Horizontal joint
-COURSE_HEIGHT = BRICK_HEIGHT + BED_JOINT  # 62.5mm
-
-WALL_WIDTH = 2300
-WALL_HEIGHT = 2000
-
-STRIDE_WIDTH = 800
-STRIDE_HEIGHT = 1300
-
-class BrickType(Enum):
-    FULL = 1
-    HALF = 2
-    DRIEKLEZOOR = 3
-
-class BondType(Enum):
-    NORMAL = 1
-    FLEMISH = 2
-    WILD = 3
-
-pygame.init()
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from brick_layer import wall_options
+from build_server import watch_wall
+from wall_engine import (
+    BondType,
+    TENTHS_PER_MM,
+    Opening,
+    WallSpec,
+    generate_wall_from_spec,
+)
+from wall_engine import generate_wall as generate_wall_from_options
 
 # Colors
 BRICK_COLOR_LIGHT_GREY = (220, 220, 220)
 BRICK_COLOR_DARK_GREY = (130, 130, 130)
 BACKGROUND_COLOR = (255, 255, 255)
 JOINT_PROBLEM_COLOR = (255, 0, 0)  # Red color for problematic joints
+STATS_BACKGROUND_COLOR = (255, 255, 255, 210)  # Translucent panel behind the stats overlay
 
 # Stride colors
 STRIDE_COLORS = [
@@ -48,579 +34,406 @@ STRIDE_COLORS = [
     (100, 90, 80),   
 ]
 
-# Scale factor
-SCALE = 0.3
-
-# Calculate scaled dimensions
-scaled_brick_length = FULL_BRICK_LENGTH * SCALE
-scaled_brick_width = FULL_BRICK_WIDTH * SCALE
-scaled_half_brick_length = HALF_BRICK_LENGTH * SCALE
-scaled_drieklezoor_length = DRIEKLEZOOR_LENGTH * SCALE
-scaled_brick_height = BRICK_HEIGHT * SCALE
-scaled_head_joint = HEAD_JOINT * SCALE
-scaled_bed_joint = BED_JOINT * SCALE
-scaled_wall_width = WALL_WIDTH * SCALE
-scaled_wall_height = WALL_HEIGHT * SCALE
-
-# Set up display
-screen_width = int(scaled_wall_width + 100)
-screen_height = int(scaled_wall_height + 100)
-screen = pygame.display.set_mode((screen_width, screen_height))
-pygame.display.set_caption("Brick Layer Simulator")
+# Scale factor, walls that don't fit the largest window are scaled down further
+DEFAULT_SCALE = 0.3
+MAX_SCREEN_SIZE = (1600, 1000)
+SCALE = DEFAULT_SCALE
+
+# Size, openings and bricks of the wall on screen
+wall_spec = WallSpec()
+
+def configure_view(spec, scale=None):
+    """Derive the scale, scaled dimensions and display size from a wall spec, fitted to the screen without a scale"""
+    global wall_spec, SCALE, scaled_brick_height, scaled_head_joint, scaled_bed_joint
+    global scaled_wall_width, scaled_wall_height, screen_width, screen_height, tenths_scale
+    wall_spec = spec
+    catalogue = spec.catalogue
+    if scale is None:
+        scale = min(DEFAULT_SCALE, (MAX_SCREEN_SIZE[0] - 100) / spec.width_mm, (MAX_SCREEN_SIZE[1] - 100) / spec.height_mm)
+    SCALE = scale
+    # Wall geometry is in tenths of a mm, this is the only place it becomes pixels
+    tenths_scale = SCALE / TENTHS_PER_MM
+    scaled_brick_height = catalogue.height * SCALE
+    scaled_head_joint = catalogue.head_joint * SCALE
+    scaled_bed_joint = catalogue.bed_joint * SCALE
+    scaled_wall_width = spec.width_mm * SCALE
+    scaled_wall_height = spec.height_mm * SCALE
+    # Display size, the window itself is only opened in main()
+    screen_width = int(scaled_wall_width + 100)
+    screen_height = int(scaled_wall_height + 100)
+
+configure_view(wall_spec)
+screen = None
+
+# Pan and zoom: the wall image of every zoom level is cut into tiles that are rendered when they first show
+TILE_SIZE = 256
+MAX_TILES = 512  # Rendered tiles kept, the least recently used go first
+ZOOM_STEP = 2 ** 0.5  # Scale change per zoom level
+MAX_ZOOM = 4.0  # Pixels per mm at the deepest zoom level
+LOD_MIN_BRICK_HEIGHT = 4  # Pixels, with lower bricks every stride is drawn as one block
+PAN_STEP = 0.25  # Part of the window the arrow keys pan
+PAN_MARGIN = 50  # Pixels of background the view can show past the edges of the wall image
+PAN_KEYS = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0), pygame.K_UP: (0, -1), pygame.K_DOWN: (0, 1)}
+
+# Frame rate cap of the viewer loop
+FPS = 60
+
+# Messages from a build server arrive as pygame events
+SERVER_EVENT = pygame.USEREVENT
 
 # global variables
-built_bricks = []
-all_bricks = []
-optimized_build_order = []
-brick_stride_map = {}
-joint_positions = {}  # Changed to dictionary with layer as key
-problematic_joints = {}  # Dictionary to track joints with long patterns {layer: [(joint_pos, pattern_type)]}
+wall = None
+built_bricks = bytearray()  # Built flag per brick id
+build_cursor = 0  # Position of the next brick in the build order
 current_bond_type = BondType.NORMAL
+show_stats = False  # Generation stats overlay, toggled with S
+zoom_level = 0
+view_x = view_y = 0  # Position of the window's top left corner in the wall image of the zoom level, in pixels
+tile_cache = OrderedDict()  # {(zoom level, tile x, tile y): Surface}, in least recently used order
+stride_blocks = None  # {stride: [left, right, low layer, high layer, build ranks]}, see get_stride_blocks
+following = None  # "wall on host:port" while the build is followed from a build server
+label_rects = []  # Window areas of the labels drawn over the wall
 
-def create_brick(x, y, x_mm, y_mm, brick_type):
-    if brick_type == BrickType.FULL:
-        width = scaled_brick_length
-    elif brick_type == BrickType.HALF:
-        width = scaled_half_brick_length
-    elif brick_type == BrickType.DRIEKLEZOOR:
-        width = scaled_drieklezoor_length
-    
-    return {
-        'x': x,
-        'y': y,
-        'width': width,
-        'type': brick_type,
-        'x_mm': x_mm,
-        'y_mm': y_mm,
-    }
-
-def update_positions(x, x_mm, brick_type, add_joint=True):
-    if brick_type == BrickType.FULL:
-        x_increment = scaled_brick_length
-        x_mm_increment = FULL_BRICK_LENGTH
-    elif brick_type == BrickType.HALF:
-        x_increment = scaled_half_brick_length
-        x_mm_increment = HALF_BRICK_LENGTH
-    elif brick_type == BrickType.DRIEKLEZOOR:
-        x_increment = scaled_drieklezoor_length
-        x_mm_increment = DRIEKLEZOOR_LENGTH
-    
-    # Add joint if needed
-    if add_joint:
-        x_increment += scaled_head_joint
-        x_mm_increment += HEAD_JOINT
-    
-    return x + x_increment, x_mm + x_mm_increment
+def brick_rect(bricks, brick_id):
+    """Screen rectangle of a brick, derived from its position in tenths of a mm"""
+    x = (screen_width - scaled_wall_width) / 2 + bricks.x_tenths[brick_id] * tenths_scale
+    y = screen_height - 50 - (bricks.layer[brick_id] + 1) * (scaled_brick_height + scaled_bed_joint)
+    return (x, y, bricks.width_tenths(brick_id) * tenths_scale, scaled_brick_height)
 
-def generate_bond_layer(start_x, bottom_y, end_x, layer, bond_type):
-    global joint_positions
-    # Create a new entry for this layer if it doesn't exist
-    if layer not in joint_positions:
-        joint_positions[layer] = []
-    else:
-        joint_positions[layer] = []  # Reset layer joints
-    
-    # Calculate position values
-    y = bottom_y - (layer + 1) * (scaled_brick_height + scaled_bed_joint)
-    x_mm = 0
-    y_mm = layer * COURSE_HEIGHT
-    is_odd_layer = layer % 2 == 1
-    x = start_x
-    
-    layer_bricks = []
-    
-    if bond_type == BondType.NORMAL:
-        # Normal bond pattern
-        # For odd layers, start with half brick
-        if is_odd_layer and x == start_x:
-            brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-            layer_bricks.append(brick)
-            x, x_mm = update_positions(x, x_mm, BrickType.HALF)
-            
-        # Add full bricks until we reach the end
-        while x < end_x:
-            remaining_width = end_x - x
-            
-            # Handle end of row
-            if remaining_width < scaled_brick_length:
-                if remaining_width >= scaled_half_brick_length:
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-                    layer_bricks.append(brick)
-                break
-                
-            # Add a full brick
-            brick = create_brick(x, y, x_mm, y_mm, BrickType.FULL)
-            layer_bricks.append(brick)
-            x, x_mm = update_positions(x, x_mm, BrickType.FULL)
-    
-    elif bond_type == BondType.FLEMISH:
-        # Flemish bond pattern
-        brick_count = 0
-        
-        while x < end_x:
-            # First brick in row
-            if brick_count == 0:
-                if is_odd_layer:
-                    # Odd layer starts with FULL brick
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.FULL)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.FULL)
-                else:
-                    # Even layer starts with DRIEKLEZOOR
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.DRIEKLEZOOR)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.DRIEKLEZOOR)
-                brick_count += 1
-                continue
-            
-            # Calculate remaining width
-            remaining_width = end_x - x
-            
-            # Handle end of row
-            if is_odd_layer:
-                # Check if it's the last brick and there's just enough room for the DRIEKLEZOOR at the end
-                if remaining_width <= scaled_drieklezoor_length:
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.DRIEKLEZOOR)
-                    layer_bricks.append(brick)
-                    break
-            else:
-                # Check if there's just enough room for the FULL brick at the end
-                if remaining_width <= scaled_brick_length:
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.FULL)
-                    layer_bricks.append(brick)
-                    break
-            
-            # Middle of row - alternating patterns
-            if is_odd_layer:
-                if brick_count % 2 == 1:  # After the first FULL, add HALF
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.HALF)
-                else:  # Then add FULL
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.FULL)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.FULL)
-            else:
-                if brick_count % 2 == 1:  # After DRIEKLEZOOR, add FULL
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.FULL)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.FULL)
-                else:  # Then add HALF
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.HALF)
-            
-            brick_count += 1
-    
-    elif bond_type == BondType.WILD:
-        # Wild bond pattern
-        brick_count = 0
-        consecutive_full_bricks = 0
-        consecutive_half_bricks = 0
-        
-        while x < end_x:
-            # First brick in row - corners have special rules
-            if brick_count == 0:
-                if is_odd_layer:
-                    # Odd layer starts with HALF brick
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.HALF)
-                    consecutive_half_bricks = 1
-                    consecutive_full_bricks = 0
-                    # Store the joint position at the end of this brick
-                    joint_positions[layer].append(x_mm - HEAD_JOINT)
-                else:
-                    # Even layer starts with DRIEKLEZOOR
-                    brick = create_brick(x, y, x_mm, y_mm, BrickType.DRIEKLEZOOR)
-                    layer_bricks.append(brick)
-                    x, x_mm = update_positions(x, x_mm, BrickType.DRIEKLEZOOR)
-                    consecutive_half_bricks = 0
-                    consecutive_full_bricks = 0
-                    # Store the joint position at the end of this brick
-                    joint_positions[layer].append(x_mm - HEAD_JOINT)
-                brick_count += 1
-                continue
-            
-            # Calculate remaining width
-            remaining_width = end_x - x
-            
-            # Handle end of row
-            if remaining_width < scaled_brick_length:
-                # If we're near the end, place the appropriate ending brick
-                if is_odd_layer:
-                    # Odd layer (starting with half) should end with drieklezoor if there's room
-                    if remaining_width >= scaled_drieklezoor_length:
-                        brick = create_brick(x, y, x_mm, y_mm, BrickType.DRIEKLEZOOR)
-                        layer_bricks.append(brick)
-                        # Store the joint position at the end of this brick
-                        joint_positions[layer].append(x_mm + DRIEKLEZOOR_LENGTH)
-                else:
-                    # Even layer (starting with drieklezoor) should end with half brick if there's room
-                    if remaining_width >= scaled_half_brick_length:
-                        brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-                        layer_bricks.append(brick)
-                        # Store the joint position at the end of this brick
-                        joint_positions[layer].append(x_mm + HALF_BRICK_LENGTH)
-                break
-            
-            # Decide whether to use a full or half brick based on rules
-            use_full_brick = False
-            
-            # Check consecutive brick types - these are primary rules
-            if consecutive_half_bricks >= 3:
-                # Rule: max 3 half bricks in a row
-                use_full_brick = True
-            elif consecutive_full_bricks >= 5:
-                # Rule: max 5 full bricks in a row
-                use_full_brick = False
-            else:
-                # Calculate the potential joint positions for both brick types
-                full_joint_pos = x_mm + FULL_BRICK_LENGTH
-                half_joint_pos = x_mm + HALF_BRICK_LENGTH
-                
-                # Check for vertical staggered patterns (falling teeth pattern across layers)
-                full_pattern_length = 0
-                half_pattern_length = 0
-                
-                # We need to check if either joint position would continue a vertical pattern
-                if layer > 0:  # Only check if we have previous layers
-                    # Look for patterns in both potential brick placements
-                    full_pattern_length = check_vertical_pattern(layer, full_joint_pos)
-                    half_pattern_length = check_vertical_pattern(layer, half_joint_pos)
-                
-                # Always choose the brick type that results in the shortest pattern
-                if full_pattern_length > half_pattern_length:
-                    use_full_brick = False  # Use half brick because it creates a shorter pattern
-                elif half_pattern_length > full_pattern_length:
-                    use_full_brick = True   # Use full brick because it creates a shorter pattern
-                else:
-                    # If both pattern lengths are equal, randomly choose with slight preference for full bricks
-                    use_full_brick = random.random() < 0.6
-            
-            # Create the appropriate brick
-            if use_full_brick:
-                brick = create_brick(x, y, x_mm, y_mm, BrickType.FULL)
-                layer_bricks.append(brick)
-                next_joint_pos = x_mm + FULL_BRICK_LENGTH
-                x, x_mm = update_positions(x, x_mm, BrickType.FULL)
-                consecutive_full_bricks += 1
-                consecutive_half_bricks = 0
-            else:
-                brick = create_brick(x, y, x_mm, y_mm, BrickType.HALF)
-                layer_bricks.append(brick)
-                next_joint_pos = x_mm + HALF_BRICK_LENGTH
-                x, x_mm = update_positions(x, x_mm, BrickType.HALF)
-                consecutive_half_bricks += 1
-                consecutive_full_bricks = 0
-            
-            # Store the joint position
-            joint_positions[layer].append(next_joint_pos)
-            
-            brick_count += 1
-    
-    return layer_bricks
-
-# Helper function to check for vertical staggered patterns
-def check_vertical_pattern(current_layer, joint_pos):
-    # Check for falling teeth pattern
-    teeth_pattern_length = check_pattern_type(current_layer, joint_pos, "falling_teeth")
-    if teeth_pattern_length > 6:
-        print("Pattern too long for falling teeth")
-        mark_problematic_joint(current_layer, joint_pos, "falling_teeth")
-    
-    # Check for staggering left pattern
-    left_pattern_length = check_pattern_type(current_layer, joint_pos, "staggering_left")
-    if left_pattern_length > 6:
-        print("Pattern too long for staggering left")
-        mark_problematic_joint(current_layer, joint_pos, "staggering_left")
-    
-    # Check for staggering right pattern
-    right_pattern_length = check_pattern_type(current_layer, joint_pos, "staggering_right")
-    if right_pattern_length > 6:
-        print("Pattern too long for staggering right")
-        mark_problematic_joint(current_layer, joint_pos, "staggering_right")
-    
-    # Return the longest pattern found
-    return max(teeth_pattern_length, left_pattern_length, right_pattern_length)
+def generate_wall():
+    global wall, built_bricks, build_cursor
+    wall = generate_wall_from_spec(wall_spec, current_bond_type, instrument=True)
+    built_bricks = bytearray(len(wall.bricks))
+    build_cursor = 0
+    reset_tiles()
 
-def mark_problematic_joint(layer, joint_pos, pattern_type):
-    """Mark a joint as part of a problematic pattern and also mark the connected joints in previous layers"""
-    global problematic_joints
-    
-    # Initialize the layer in the dictionary if it doesn't exist
-    if layer not in problematic_joints:
-        problematic_joints[layer] = []
-    
-    # Add the joint to the problematic joints list if not already there
-    joint_info = (joint_pos, pattern_type)
-    if joint_info not in problematic_joints[layer]:
-        problematic_joints[layer].append(joint_info)
-    
-    # Now trace the pattern back and mark all related joints in previous layers
-    trace_pattern_joints(layer, joint_pos, pattern_type)
+def generate_served_wall(spec):
+    """Generate the wall a build server is building from its manifest entry and show it unbuilt"""
+    global wall, built_bricks, build_cursor, current_bond_type
+    wall = generate_wall_from_options(**wall_options(spec), instrument=True)
+    current_bond_type = wall.bond_type
+    configure_view(wall.spec)
+    built_bricks = bytearray(len(wall.bricks))
+    build_cursor = 0
+    reset_tiles()
+    reset_view()
 
-def trace_pattern_joints(current_layer, joint_pos, pattern_type):
-    """Trace the pattern backwards and mark all joints in the problematic pattern"""
-    vertical_offset = 55
-    max_offset_tolerance = 10
-    
-    current_pos = joint_pos
-    original_pos = joint_pos
-    offset_pos = None
-    
-    # Start checking from the current_layer downward
-    for layer_id in range(current_layer-1, -1, -1):
-        if layer_id not in joint_positions:
-            break
-            
-        found_match = False
-        matched_joint = None
-        
-        for joint in joint_positions[layer_id]:
-            offset = joint - current_pos  # Positive = right, negative = left
-            
-            if pattern_type == "falling_teeth":
-                layer_offset = current_layer - layer_id
-                
-                if layer_offset % 2 == 0:
-                    # Even offset - should align with original position
-                    if abs(joint - original_pos) <= max_offset_tolerance:
-                        found_match = True
-                        current_pos = joint
-                        matched_joint = joint
-                        break
-                else:
-                    # Odd offset - should be at the offset position
-                    if offset_pos is None:
-                        # First time we've encountered an odd layer
-                        if abs(abs(joint - original_pos) - vertical_offset) <= max_offset_tolerance:
-                            offset_pos = joint
-                            found_match = True
-                            current_pos = joint
-                            matched_joint = joint
-                            break
-                    else:
-                        # Check if this odd layer aligns with previous odd layers
-                        if abs(joint - offset_pos) <= max_offset_tolerance:
-                            found_match = True
-                            current_pos = joint
-                            matched_joint = joint
-                            break
-                    
-            elif pattern_type == "staggering_left":
-                # For staggering left, we want negative offset (around -55mm)
-                if abs(offset + vertical_offset) <= max_offset_tolerance:
-                    found_match = True
-                    current_pos = joint
-                    matched_joint = joint
-                    break
-                    
-            elif pattern_type == "staggering_right":
-                # For staggering right, we want positive offset (around +55mm)
-                if abs(offset - vertical_offset) <= max_offset_tolerance:
-                    found_match = True
-                    current_pos = joint
-                    matched_joint = joint
-                    break
-        
-        if found_match and matched_joint is not None:
-            # Mark this joint as problematic
-            if layer_id not in problematic_joints:
-                problematic_joints[layer_id] = []
-            joint_info = (matched_joint, pattern_type)
-            if joint_info not in problematic_joints[layer_id]:
-                problematic_joints[layer_id].append(joint_info)
-        else:
-            break
-    
-    # For falling teeth pattern, we need at least 3 layers to confirm the pattern
-    if pattern_type == "falling_teeth" and len(problematic_joints.get(current_layer, [])) < 2:
-        # Remove the single joint if we don't have enough to confirm the pattern
-        if current_layer in problematic_joints:
-            problematic_joints[current_layer] = [j for j in problematic_joints[current_layer] 
-                                              if j[1] != "falling_teeth" or j[0] != joint_pos]
-
-def check_pattern_type(current_layer, joint_pos, pattern_type):
-    # The offset distance we're looking for between layers
-    vertical_offset = 55
-    
-    pattern_length = 0
-    current_pos = joint_pos
-    
-    # For falling teeth pattern, we need to track both positions in the alternating pattern
-    original_pos = joint_pos
-    offset_pos = None  # Will be set when we find the first offset position
-    
-    # Start checking from the current_layer downward
-    for layer_id in range(current_layer-1, -1, -1):
-        if layer_id not in joint_positions:
-            break
-            
-        found_match = False
-        
-        for joint in joint_positions[layer_id]:
-            offset = joint - current_pos  # Positive = right, negative = left
-            
-            if pattern_type == "falling_teeth":
-                layer_offset = current_layer - layer_id
-                
-                if layer_offset % 2 == 0:
-                    # Even offset - should align with original position
-                    if abs(joint - original_pos) == 0:
-                        found_match = True
-                        current_pos = joint
-                        break
-                else:
-                    # Odd offset - should be at the offset position
-                    if offset_pos is None:
-                        # First time we've encountered an odd layer
-                        # Calculate how far this is from the original position
-                        if abs(abs(joint - original_pos) - vertical_offset) == 0:
-                            offset_pos = joint  # Remember this position for future odd layers
-                            found_match = True
-                            current_pos = joint
-                            break
-                    else:
-                        # Check if this odd layer aligns with previous odd layers
-                        if abs(joint - offset_pos) == 0:
-                            found_match = True
-                            current_pos = joint
-                            break
-                    
-            elif pattern_type == "staggering_left":
-                # For staggering left, we want negative offset (around -55mm)
-                if abs(offset + vertical_offset) == 0:
-                    found_match = True
-                    current_pos = joint
-                    break
-                    
-            elif pattern_type == "staggering_right":
-                # For staggering right, we want positive offset (around +55mm)
-                if abs(offset - vertical_offset) == 0:
-                    found_match = True
-                    current_pos = joint
-                    break
-        
-        if found_match:
-            pattern_length += 1
-        else:
-            break
-    
-    # For falling teeth pattern, we need at least 3 layers to confirm the pattern
-    if pattern_type == "falling_teeth" and pattern_length < 2:
-        return 0
+def brick_color(brick_id):
+    if built_bricks[brick_id]:
+        # Use the stride color for built bricks
+        return STRIDE_COLORS[wall.bricks.stride[brick_id] % len(STRIDE_COLORS)]
+    return BRICK_COLOR_LIGHT_GREY
+
+def draw_problematic_joints(surface, layer):
+    for joint_pos, pattern_type in wall.problematic_joints.get(layer, ()):
+        # Calculate the screen position of the joint
+        x = (screen_width - scaled_wall_width) / 2 + (joint_pos * tenths_scale)
+        y = screen_height - 50 - (layer + 1) * (scaled_brick_height + scaled_bed_joint)
         
-    return pattern_length
+        # Draw a red vertical line at the joint position
+        pygame.draw.rect(
+            surface,
+            JOINT_PROBLEM_COLOR,
+            (x - scaled_head_joint/2, y, scaled_head_joint, scaled_brick_height)
+        )
 
-def generate_wall():
-    global all_bricks
-    all_bricks = []  # Clear any existing bricks
-    
-    # Start position
-    start_x = (screen_width - scaled_wall_width) / 2
-    bottom_y = screen_height - 50
-    end_x = start_x + scaled_wall_width
-    
-    # Calculate number of layers
-    num_layers = int(WALL_HEIGHT / COURSE_HEIGHT)
-    
-    # Generate each layer
-    for layer in range(num_layers):
-        layer_bricks = generate_bond_layer(start_x, bottom_y, end_x, layer, current_bond_type)
-        all_bricks.append(layer_bricks)
-    
-    # After creating the wall layout, we need to optimize the build order
-    calculate_build_order()
-
-#calulate which stride each brick belongs to and sort the bricks in the build order
-def calculate_build_order():
-    global optimized_build_order, brick_stride_map
-    optimized_build_order = []  # Clear existing build order
-    brick_stride_map = {}  # Clear existing stride map
-
-    horizontal_strides = math.ceil(WALL_WIDTH / STRIDE_WIDTH)
-    vertical_strides = math.ceil(WALL_HEIGHT / STRIDE_HEIGHT)
-    # Group bricks by stride in dictionary
-    stride_bricks = {}
-    
-    # Assign bricks to strides
-    for layer in all_bricks:
-        for brick in layer:
-            # Calculate stride for each brick based on mm positions
-            brickwidth_mm = brick['width'] / SCALE
-            x_stride = int((brick['x_mm'] + (brickwidth_mm / 2)) / STRIDE_WIDTH)
-            y_stride = int((brick['y_mm'] + (COURSE_HEIGHT / 2)) / STRIDE_HEIGHT)
-            stride_key = (x_stride, y_stride)
-            
-            if stride_key not in stride_bricks:
-                stride_bricks[stride_key] = []
-            
-            stride_bricks[stride_key].append(brick)
-            
-            # Create a dictionary to map each brick to its stride for coloring
-            stride_index = y_stride * horizontal_strides + x_stride
-            brick_key = (brick['x_mm'], brick['y_mm'])
-            brick_stride_map[brick_key] = stride_index % len(STRIDE_COLORS)
-    
-    # Build the optimized order by iterating through strides from bottom to top and left to right
-    for v in range(vertical_strides):
-        for h in range(horizontal_strides):
-            stride_key = (h, v)
-            if stride_key in stride_bricks:
-                # Sort bricks within this stride
-                stride_group = stride_bricks[stride_key]
-                # sort by horizontal position
-                stride_group.sort(key=lambda b: b['x_mm'])
-                # Sort by vertical position
-                stride_group.sort(key=lambda b: b['y_mm'])
-                # Append the sorted bricks to the optimized build order
-                optimized_build_order.extend(stride_group)
-
-def draw_wall():
+def draw_wall(surface):
     # Draw all bricks
-    for layer in all_bricks:
-        for brick in layer:
-            if brick in built_bricks:
-                # Use the stride color for built bricks
-                brick_key = (brick['x_mm'], brick['y_mm'])
-                stride_index = brick_stride_map.get(brick_key, 0)
-                color = STRIDE_COLORS[stride_index]
-            else:
-                color = BRICK_COLOR_LIGHT_GREY
-            # Draw the brick
-            pygame.draw.rect(
-                screen,
-                color,
-                (brick['x'], brick['y'], brick['width'], scaled_brick_height)
-            )
+    bricks = wall.bricks
+    for brick_id in range(len(bricks)):
+        pygame.draw.rect(surface, brick_color(brick_id), brick_rect(bricks, brick_id))
     
     # Draw problematic joints
-    for layer, joints in problematic_joints.items():
-        for joint_pos, pattern_type in joints:
-            # Calculate the screen position of the joint
-            x = (screen_width - scaled_wall_width) / 2 + (joint_pos * SCALE)
-            y = screen_height - 50 - (layer + 1) * (scaled_brick_height + scaled_bed_joint)
-            
-            # Draw a red vertical line at the joint position
-            pygame.draw.rect(
-                screen,
-                JOINT_PROBLEM_COLOR,
-                (x - scaled_head_joint/2, y, scaled_head_joint, scaled_brick_height)
-            )
+    for layer in wall.problematic_joints:
+        draw_problematic_joints(surface, layer)
+
+def draw_brick(surface, brick_id):
+    """Redraw a single brick and the joints on its course, returning the changed area"""
+    bricks = wall.bricks
+    rect = pygame.Rect(brick_rect(bricks, brick_id))
+    pygame.draw.rect(surface, brick_color(brick_id), rect)
+    draw_problematic_joints(surface, bricks.layer[brick_id])
+    # Cover the rounding of the float rectangle and the joint marks at its ends
+    return rect.inflate(int(scaled_head_joint) + 2, 2)
+
+def stats_lines():
+    """Text lines of the stats overlay: phase timings first, then the counters"""
+    stats = wall.stats.as_dict()
+    lines = [f"{phase}: {seconds * 1000:.1f} ms ({stats['calls'][phase]}x)" for phase, seconds in stats['timers_s'].items()]
+    lines += [f"{name.replace('_', ' ')}: {count}" for name, count in stats['counters'].items()]
+    lines.append(f"joints scanned per lookup: {stats['joints_scanned_per_lookup']}")
+    return lines
+
+def draw_stats_overlay(surface, font):
+    """Draw the stats overlay in the top right corner and return its area"""
+    texts = [font.render(line, True, (0, 0, 0)) for line in stats_lines()]
+    width = max(text.get_width() for text in texts) + 20
+    height = sum(text.get_height() for text in texts) + 20
+    rect = pygame.Rect(screen_width - width - 10, 10, width, height)
+    panel = pygame.Surface(rect.size, pygame.SRCALPHA)
+    panel.fill(STATS_BACKGROUND_COLOR)
+    surface.blit(panel, rect)
+    y = rect.y + 10
+    for text in texts:
+        surface.blit(text, (rect.x + 10, y))
+        y += text.get_height()
+    return rect
+
+def zoom_scale(level):
+    """Pixels per mm at a zoom level, level 0 shows the whole wall"""
+    return SCALE * ZOOM_STEP ** level
+
+def max_zoom_level():
+    return max(0, math.ceil(math.log(MAX_ZOOM / SCALE, ZOOM_STEP)))
+
+def image_height(zoom):
+    """Height in pixels of the wall image at a zoom, from the top of the highest course"""
+    return wall.num_layers * wall.catalogue.course_height * zoom
+
+def reset_view():
+    """Zoom out to the whole wall, placed like the fitted view"""
+    global zoom_level, view_x, view_y
+    zoom_level = 0
+    view_x = -(screen_width - int(scaled_wall_width)) // 2
+    view_y = -(screen_height - 50 - int(image_height(SCALE)))
+
+def reset_tiles():
+    """Forget the rendered tiles and stride blocks, for a new wall"""
+    global stride_blocks
+    tile_cache.clear()
+    stride_blocks = None
+
+def zoom_at(level, x, y):
+    """Change the zoom level keeping the wall under window position (x, y) in place"""
+    global zoom_level, view_x, view_y
+    level = min(max(level, 0), max_zoom_level())
+    ratio = zoom_scale(level) / zoom_scale(zoom_level)
+    view_x = round((view_x + x) * ratio) - x
+    view_y = round((view_y + y) * ratio) - y
+    zoom_level = level
+    clamp_view()
+
+def pan(dx, dy):
+    global view_x, view_y
+    view_x += int(dx)
+    view_y += int(dy)
+    clamp_view()
+
+def clamp_view():
+    """Keep the window on the wall image: a wall that fits stays whole, a bigger one can't be panned out of view"""
+    global view_x, view_y
+    zoom = zoom_scale(zoom_level)
+    width = int(wall.width_mm * zoom)
+    height = int(image_height(zoom))
+    view_x = min(max(view_x, min(-PAN_MARGIN, width - screen_width)), max(0, width - screen_width + PAN_MARGIN))
+    view_y = min(max(view_y, min(-PAN_MARGIN, height - screen_height)), max(0, height - screen_height + PAN_MARGIN))
+
+def get_stride_blocks():
+    """Extent of every stride and the build order positions of its bricks, sorted.
+
+    A stride is drawn as a block at far zoom levels, filled from the bottom as far
+    as its bricks are built. The build order positions tell how many are built from
+    the build cursor alone.
+    """
+    global stride_blocks
+    if stride_blocks is None:
+        bricks = wall.bricks
+        blocks = {}
+        for rank, brick_id in enumerate(wall.build_order):
+            x = bricks.x_tenths[brick_id]
+            right = x + bricks.width_tenths(brick_id)
+            layer = bricks.layer[brick_id]
+            block = blocks.get(bricks.stride[brick_id])
+            if block is None:
+                blocks[bricks.stride[brick_id]] = [x, right, layer, layer, [rank]]
+            else:
+                block[0] = min(block[0], x)
+                block[1] = max(block[1], right)
+                block[2] = min(block[2], layer)
+                block[3] = max(block[3], layer)
+                block[4].append(rank)
+        stride_blocks = blocks
+    return stride_blocks
+
+def _tile_courses(zoom, top, bottom):
+    """Layers whose courses show between two heights in pixels of the wall image at a zoom"""
+    course = wall.catalogue.course_height * zoom
+    last = wall.num_layers - 1
+    return range(max(0, last - int(bottom // course)), min(len(wall.layers), last - int(top // course) + 1))
+
+def render_tile(level, tile_x, tile_y):
+    """Render one tile of the wall image at a zoom level"""
+    zoom = zoom_scale(level)
+    tile = pygame.Surface((TILE_SIZE, TILE_SIZE))
+    tile.fill(BACKGROUND_COLOR)
+    left = tile_x * TILE_SIZE
+    top = tile_y * TILE_SIZE
+    catalogue = wall.catalogue
+    course = catalogue.course_height * zoom
+    last = wall.num_layers - 1
+    brick_height = catalogue.height * zoom
+
+    if brick_height < LOD_MIN_BRICK_HEIGHT:
+        # Far away bricks are a few pixels each, a block per stride shows the progress instead
+        scale = zoom / TENTHS_PER_MM
+        for stride, (x, right, low, high, ranks) in get_stride_blocks().items():
+            rect = pygame.Rect(int(x * scale) - left, int((last - high) * course) - top, 0, 0)
+            rect.width = max(1, int(right * scale) - left - rect.x)
+            rect.height = max(1, int((last - low) * course + brick_height) - top - rect.y)
+            if not rect.colliderect(tile.get_rect()):
+                continue
+            pygame.draw.rect(tile, BRICK_COLOR_LIGHT_GREY, rect)
+            built = bisect_left(ranks, build_cursor)
+            if built:
+                filled = max(1, round(rect.height * built / len(ranks)))
+                pygame.draw.rect(tile, STRIDE_COLORS[stride % len(STRIDE_COLORS)],
+                                 (rect.x, rect.bottom - filled, rect.width, filled))
+        return tile
+
+    bricks = wall.bricks
+    x_tenths = bricks.x_tenths
+    scale = zoom / TENTHS_PER_MM
+    longest = max(bricks.lengths_by_code)
+    head_joint = catalogue.head_joint * zoom
+    for layer in _tile_courses(zoom, top, top + TILE_SIZE):
+        y = (last - layer) * course - top
+        ids = wall.layers[layer]
+        # Bricks of a course are laid left to right, so the first one in the tile is found by bisection
+        first = bisect_right(x_tenths, left / scale - longest, ids.start, ids.stop)
+        for brick_id in range(first, ids.stop):
+            x = x_tenths[brick_id] * scale - left
+            if x >= TILE_SIZE:
+                break
+            pygame.draw.rect(tile, brick_color(brick_id), (x, y, bricks.width_tenths(brick_id) * scale, brick_height))
+        for joint_pos, pattern_type in wall.problematic_joints.get(layer, ()):
+            x = joint_pos * scale - left
+            if -head_joint <= x <= TILE_SIZE + head_joint:
+                pygame.draw.rect(tile, JOINT_PROBLEM_COLOR, (x - head_joint / 2, y, head_joint, brick_height))
+    return tile
+
+def get_tile(level, tile_x, tile_y):
+    """A rendered tile from the cache, rendering it on a miss and dropping the least recently used beyond MAX_TILES"""
+    key = (level, tile_x, tile_y)
+    tile = tile_cache.get(key)
+    if tile is not None:
+        tile_cache.move_to_end(key)
+        return tile
+    tile = tile_cache[key] = render_tile(level, tile_x, tile_y)
+    if len(tile_cache) > MAX_TILES:
+        tile_cache.popitem(last=False)
+    return tile
+
+def changed_area(brick_id, level):
+    """Area of the wall image at a zoom level that building a brick changes, in pixels.
+
+    That is the brick itself, or at far zoom levels the block of its whole stride,
+    with a pixel to spare on every side for rounding.
+    """
+    bricks = wall.bricks
+    catalogue = wall.catalogue
+    zoom = zoom_scale(level)
+    scale = zoom / TENTHS_PER_MM
+    course = catalogue.course_height * zoom
+    last = wall.num_layers - 1
+    block = get_stride_blocks().get(bricks.stride[brick_id])
+    if block is not None and catalogue.height * zoom < LOD_MIN_BRICK_HEIGHT:
+        left, right, low, high = block[:4]
+    else:
+        left = bricks.x_tenths[brick_id]
+        right = left + bricks.width_tenths(brick_id)
+        low = high = bricks.layer[brick_id]
+    x = math.floor(left * scale) - 1
+    y = math.floor((last - high) * course) - 1
+    return pygame.Rect(x, y, math.ceil(right * scale) + 1 - x, math.ceil((last - low) * course + catalogue.height * zoom) + 1 - y)
+
+def invalidate_brick(brick_id):
+    """Drop the cached tiles a brick shows in, so they are rendered again with its new color.
+
+    Returns the area of the window that changed at the current zoom and pan.
+    """
+    areas = {}  # Changed area per zoom level
+    for key in list(tile_cache):
+        level, tile_x, tile_y = key
+        area = areas.get(level)
+        if area is None:
+            area = areas[level] = changed_area(brick_id, level)
+        if area.colliderect((tile_x * TILE_SIZE, tile_y * TILE_SIZE, TILE_SIZE, TILE_SIZE)):
+            del tile_cache[key]
+    area = areas.get(zoom_level)
+    if area is None:
+        area = changed_area(brick_id, zoom_level)
+    return area.move(-view_x, -view_y).clip((0, 0, screen_width, screen_height))
+
+def draw_labels(surface, font):
+    """Draw the bond, the controls and the stats overlay over the wall, returning their areas"""
+    if current_bond_type == BondType.NORMAL:
+        bond_name = "NORMAL"
+    elif current_bond_type == BondType.FLEMISH:
+        bond_name = "FLEMISH"
+    else:
+        # Show the seed so a wall worth keeping can be re-created
+        bond_name = f"WILD (seed {wall.seed})"
+    bond_type_string = f"Current Bond: {bond_name}"
+    if zoom_level:
+        bond_type_string += f", zoom {zoom_scale(zoom_level) / SCALE:.1f}x"
+    bond_text = font.render(bond_type_string, True, (0, 0, 0))
+    rects = [surface.blit(bond_text, (10, 10))]
+    if following is not None:
+        controls = f"Following {following}, S = stats"
+    else:
+        controls = "Controls: ENTER = add brick, SPACE = switch bond, S = stats"
+    controls += ", wheel/+/- = zoom, drag/arrows = pan, HOME = whole wall"
+    controls_surface = font.render(controls, True, (0, 0, 0))
+    rects.append(surface.blit(controls_surface, (10, screen_height - 30)))
+    if show_stats:
+        rects.append(draw_stats_overlay(surface, font))
+    return rects
+
+def draw_view(surface, font, area=None):
+    """Draw the visible tiles of the wall at the current zoom and pan, with the labels on top.
+
+    With an area only that part of the window is drawn, for updating the bricks that
+    were just built.
+    """
+    global label_rects
+    surface.set_clip(area)
+    clip = surface.get_clip()
+    surface.fill(BACKGROUND_COLOR)
+    # Only the tiles that overlap the window are fetched, the rest of the wall costs nothing
+    first_x, first_y = (view_x + clip.left) // TILE_SIZE, (view_y + clip.top) // TILE_SIZE
+    last_x, last_y = (view_x + clip.right - 1) // TILE_SIZE, (view_y + clip.bottom - 1) // TILE_SIZE
+    zoom = zoom_scale(zoom_level)
+    columns = math.ceil(wall.width_mm * zoom / TILE_SIZE)
+    rows = math.ceil(image_height(zoom) / TILE_SIZE)
+    for tile_y in range(max(first_y, 0), min(last_y, rows - 1) + 1):
+        for tile_x in range(max(first_x, 0), min(last_x, columns - 1) + 1):
+            surface.blit(get_tile(zoom_level, tile_x, tile_y), (tile_x * TILE_SIZE - view_x, tile_y * TILE_SIZE - view_y))
+
+    if area is None:
+        label_rects = draw_labels(surface, font)
+    elif clip.collidelist(label_rects) != -1:
+        # The labels are drawn over the wall, so they go on top of the redrawn part again
+        draw_labels(surface, font)
+    surface.set_clip(None)
 
 def build_next_brick():
-    global built_bricks
-    
-    # Find the next unbuilt brick
-    for brick in optimized_build_order:
-        if brick not in built_bricks:
-            built_bricks.append(brick)
-            return True
-    return False
+    global build_cursor
+    
+    # The cursor points at the next unbuilt brick
+    if build_cursor >= len(wall.build_order):
+        return False
+    built_bricks[wall.build_order[build_cursor]] = 1
+    build_cursor += 1
+    return True
+
+def unbuild_wall():
+    global built_bricks, build_cursor
+    built_bricks = bytearray(len(wall.bricks))
+    build_cursor = 0
+    tile_cache.clear()
 
 def switch_bond_type():
-    global current_bond_type, built_bricks, joint_positions, problematic_joints
+    global current_bond_type
     
     if current_bond_type == BondType.NORMAL:
         current_bond_type = BondType.FLEMISH
@@ -629,47 +442,149 @@ def switch_bond_type():
     else:
         current_bond_type = BondType.NORMAL
     
-    # Reset the built bricks and joint positions
-    built_bricks = []
-    joint_positions = {}
-    problematic_joints = {}  # Also reset problematic joints
+    # The new wall comes with fresh joint state and resets the built bricks
     generate_wall()
 
-def main():
+def follow_server(host, port, name):
+    """Forward the messages of a build server about a wall to the event loop, run in a thread of its own"""
+    def post(message):
+        try:
+            pygame.event.post(pygame.event.Event(SERVER_EVENT, message=message))
+        except pygame.error:
+            # The window closed while the server was talking
+            pass
+    try:
+        asyncio.run(watch_wall(host, port, name, post))
+    except OSError as error:
+        post({'op': 'error', 'message': str(error)})
+    post({'op': 'closed'})
+
+def parse_server(value):
+    host, _, port = value.rpartition(':')
+    if not host or not port.isdigit():
+        raise argparse.ArgumentTypeError("a build server is HOST:PORT")
+    return host, int(port)
+
+def parse_opening(value):
+    try:
+        return Opening(*(float(part) for part in value.split(',')))
+    except TypeError:
+        raise argparse.ArgumentTypeError("an opening is x,y,width,height in mm")
+
+def main(argv=None):
+    global screen, show_stats, following
+
+    parser = argparse.ArgumentParser(description="Step through the build order of a wall")
+    parser.add_argument('--width', type=int, default=wall_spec.width_mm, help="wall width in mm")
+    parser.add_argument('--height', type=int, default=wall_spec.height_mm, help="wall height in mm")
+    parser.add_argument('--opening', type=parse_opening, action='append', default=[],
+                        help="leave an x,y,width,height opening in mm, can be repeated")
+    parser.add_argument('--server', type=parse_server, help="follow a wall on the build server at HOST:PORT")
+    parser.add_argument('--wall', help="name of the wall to follow on the build server")
+    args = parser.parse_args(argv)
+    if (args.server is None) != (args.wall is None):
+        parser.error("--server and --wall go together")
+    configure_view(WallSpec(args.width, args.height, args.opening))
+
+    # Set up display
+    pygame.init()
+    screen = pygame.display.set_mode((screen_width, screen_height))
+    pygame.display.set_caption("Brick Layer Simulator")
+    clock = pygame.time.Clock()
+
     generate_wall()
+    reset_view()
     
     # Initialize font
     font = pygame.font.SysFont(None, 24)
+    redraw = True
+    dirty_rects = []
+
+    if args.server is not None:
+        host, port = args.server
+        following = f"{args.wall} on {host}:{port}"
+        threading.Thread(target=follow_server, args=(host, port, args.wall), daemon=True).start()
     
     running = True
     while running:
-        for event in pygame.event.get():
+        # Sleep until something happens, nothing on screen changes on its own
+        for event in [pygame.event.wait()] + pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == SERVER_EVENT:
+                message = event.message
+                if message['op'] == 'watching':
+                    # Same spec and seed, so the same wall and build order as on the server
+                    generate_served_wall(message['spec'])
+                    screen = pygame.display.set_mode((screen_width, screen_height))
+                if message['op'] in ('watching', 'progress'):
+                    placed = min(message['placed'], len(wall.build_order))
+                    if placed < build_cursor:
+                        # A controller resumed at an earlier brick
+                        unbuild_wall()
+                        redraw = True
+                    if message['op'] == 'watching' or placed - build_cursor > MAX_TILES:
+                        # Most tiles change anyway
+                        tile_cache.clear()
+                        redraw = True
+                    while build_cursor < placed:
+                        build_next_brick()
+                        if tile_cache:
+                            dirty_rects.append(invalidate_brick(wall.build_order[build_cursor - 1]))
+                elif message['op'] == 'error':
+                    print(f"Build server: {message['message']}", file=sys.stderr)
+                elif message['op'] == 'closed':
+                    pygame.display.set_caption(f"Brick Layer Simulator - {following}, disconnected")
+            elif following is not None and event.type == pygame.KEYDOWN and event.key in (pygame.K_RETURN, pygame.K_SPACE):
+                # The build server decides which bricks are built
+                pass
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_RETURN:  # ENTER key
-                    build_next_brick()
+                    if build_next_brick():
+                        dirty_rects.append(invalidate_brick(wall.build_order[build_cursor - 1]))
             elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:  # SPACE key
                     switch_bond_type()
+                    redraw = True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_s:  # S key
+                    show_stats = not show_stats
+                    redraw = True
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    zoom_at(zoom_level + 1, screen_width // 2, screen_height // 2)
+                    redraw = True
+            elif event.type == pygame.KEYDOWN and event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    zoom_at(zoom_level - 1, screen_width // 2, screen_height // 2)
+                    redraw = True
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_HOME:
+                    reset_view()
+                    redraw = True
+            elif event.type == pygame.KEYDOWN and event.key in PAN_KEYS:
+                    dx, dy = PAN_KEYS[event.key]
+                    pan(dx * PAN_STEP * screen_width, dy * PAN_STEP * screen_height)
+                    redraw = True
+            elif event.type == pygame.MOUSEWHEEL:
+                zoom_at(zoom_level + event.y, *pygame.mouse.get_pos())
+                redraw = True
+            elif event.type == pygame.MOUSEMOTION and event.buttons[0]:
+                # Drag the wall along with the mouse
+                pan(-event.rel[0], -event.rel[1])
+                redraw = True
+            elif event.type == pygame.VIDEOEXPOSE:
+                redraw = True
         
-        # First clear the screen and then draw wall
-        screen.fill(BACKGROUND_COLOR)
-        draw_wall()
-        
-        # Display current bond type and controls
-        if current_bond_type == BondType.NORMAL:
-            bond_name = "NORMAL"
-        elif current_bond_type == BondType.FLEMISH:
-            bond_name = "FLEMISH"
-        else:
-            bond_name = "WILD"
-        bond_type_string = f"Current Bond: {bond_name}"
-        bond_text = font.render(bond_type_string, True, (0, 0, 0))
-        screen.blit(bond_text, (10, 10))
-        controls_surface = font.render("Controls: ENTER = add brick, SPACE = switch bond", True, (0, 0, 0))
-        screen.blit(controls_surface, (10, screen_height - 30))
+        # Composing a frame only blits the visible tiles, whatever the size of the wall
+        if redraw:
+            draw_view(screen, font)
+            pygame.display.flip()
+            redraw = False
+        elif dirty_rects:
+            # Only the areas of the bricks that were built are drawn and sent to the display
+            dirty_rects = [rect for rect in dirty_rects if rect]
+            for rect in dirty_rects:
+                draw_view(screen, font, rect)
+            pygame.display.update(dirty_rects)
+        dirty_rects = []
         
-        # Update the display
-        pygame.display.flip()
+        # Cap the frame rate when keys come in faster than the screen needs
+        clock.tick(FPS)
     
     pygame.quit()
     sys.exit()
@@ -0,0 +1,178 @@
+"""Stream a wall's build order to CSV, JSON lines or a compact binary format
+
+Bricks are written as soon as their stride row is planned, so a robot controller
+reading from a pipe can start on stride (0, 0) while the rest of the wall is
+still being generated.
+
+Usage: python build_export.py [--format csv|jsonl|binary] [--output FILE]
+                              [--width MM] [--height MM] [--bond NORMAL|FLEMISH|WILD] [--seed N]
+                              [--planner grid|reach] [--objective moves|travel]
+       python build_export.py --wall-file WALL [--format csv|jsonl|binary] [--output FILE]
+
+--stats FILE writes the generation timers and counters of the wall as JSON.
+"""
+import argparse
+import csv
+import json
+import os
+import struct
+import sys
+
+from wall_engine import (
+    BUILD_PLANNERS,
+    BondType,
+    BrickType,
+    PLANNER_OBJECTIVES,
+    STRIDE_HEIGHT,
+    STRIDE_WIDTH,
+    WALL_HEIGHT,
+    WALL_WIDTH,
+    Wall,
+    iter_build_order,
+)
+from wall_file import WallFile
+
+FIELDS = ('sequence', 'stride_x', 'stride_y', 'type', 'x_mm', 'y_mm')
+
+# Binary format: a header followed by fixed-size little endian records of
+# sequence, stride x, stride y, brick type value, x and y in tenths of a millimetre
+BINARY_MAGIC = b'BLBO'
+BINARY_VERSION = 1
+BINARY_HEADER = struct.Struct('<4sBB')
+BINARY_RECORD = struct.Struct('<IHHBii')
+
+def build_step(wall, sequence, brick_id):
+    """The record of the brick laid at a position in the build order"""
+    bricks = wall.bricks
+    stride = bricks.stride[brick_id]
+    return {
+        'sequence': sequence,
+        'stride_x': stride % wall.horizontal_strides,
+        'stride_y': stride // wall.horizontal_strides,
+        'type': bricks.brick_type(brick_id),
+        'x_mm': bricks.x_mm(brick_id),
+        'y_mm': bricks.y_mm(brick_id),
+    }
+
+def iter_build_steps(wall):
+    """Yield one dictionary per brick in build order, planning the wall as it goes"""
+    for sequence, brick_id in enumerate(iter_build_order(wall)):
+        yield build_step(wall, sequence, brick_id)
+
+def _flush_per_stride(steps, file):
+    """Pass steps through, flushing the file whenever a new stride starts"""
+    current_stride = None
+    for step in steps:
+        stride = (step['stride_x'], step['stride_y'])
+        if stride != current_stride:
+            if current_stride is not None:
+                file.flush()
+            current_stride = stride
+        yield step
+    file.flush()
+
+def write_csv(steps, file):
+    writer = csv.writer(file)
+    writer.writerow(FIELDS)
+    count = 0
+    for step in _flush_per_stride(steps, file):
+        writer.writerow((step['sequence'], step['stride_x'], step['stride_y'],
+                         step['type'].name, step['x_mm'], step['y_mm']))
+        count += 1
+    return count
+
+def write_jsonl(steps, file):
+    count = 0
+    for step in _flush_per_stride(steps, file):
+        file.write(json.dumps({**step, 'type': step['type'].name}) + '\n')
+        count += 1
+    return count
+
+def write_binary(steps, file):
+    """Write steps to a binary file object, see BINARY_RECORD for the layout"""
+    file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_VERSION, BINARY_RECORD.size))
+    count = 0
+    for step in _flush_per_stride(steps, file):
+        file.write(BINARY_RECORD.pack(
+            step['sequence'],
+            step['stride_x'],
+            step['stride_y'],
+            step['type'].value,
+            round(step['x_mm'] * 10),
+            round(step['y_mm'] * 10),
+        ))
+        count += 1
+    return count
+
+def read_binary(file):
+    """Yield the steps of a file written by write_binary"""
+    magic, version, record_size = BINARY_HEADER.unpack(file.read(BINARY_HEADER.size))
+    if magic != BINARY_MAGIC or version != BINARY_VERSION or record_size != BINARY_RECORD.size:
+        raise ValueError("Not a version 1 build order file")
+    while True:
+        record = file.read(record_size)
+        if len(record) < record_size:
+            return
+        sequence, stride_x, stride_y, type_value, x_tenths, y_tenths = BINARY_RECORD.unpack(record)
+        yield {
+            'sequence': sequence,
+            'stride_x': stride_x,
+            'stride_y': stride_y,
+            'type': BrickType(type_value),
+            'x_mm': x_tenths / 10,
+            'y_mm': y_tenths / 10,
+        }
+
+WRITERS = {
+    'csv': write_csv,
+    'jsonl': write_jsonl,
+    'binary': write_binary,
+}
+
+def export_build_order(wall, file, fmt='jsonl'):
+    """Stream the build order of wall to an open file and return the number of bricks written"""
+    return WRITERS[fmt](iter_build_steps(wall), file)
+
+def _export_steps(steps, args):
+    binary = args.format == 'binary'
+    if args.output:
+        with open(args.output, 'wb' if binary else 'w', newline=None if binary else '') as file:
+            WRITERS[args.format](steps, file)
+    else:
+        try:
+            WRITERS[args.format](steps, sys.stdout.buffer if binary else sys.stdout)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader stopped early, like head. Point stdout at devnull so the flush at exit doesn't fail again
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a wall's build order")
+    parser.add_argument('--format', choices=sorted(WRITERS), default='jsonl')
+    parser.add_argument('--output', help="output file, standard output if omitted")
+    parser.add_argument('--width', type=float, default=WALL_WIDTH)
+    parser.add_argument('--height', type=float, default=WALL_HEIGHT)
+    parser.add_argument('--bond', choices=[bond.name for bond in BondType], default=BondType.NORMAL.name)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--stride-width', type=float, default=STRIDE_WIDTH)
+    parser.add_argument('--stride-height', type=float, default=STRIDE_HEIGHT)
+    parser.add_argument('--planner', choices=BUILD_PLANNERS, default='grid')
+    parser.add_argument('--objective', choices=PLANNER_OBJECTIVES, default='moves')
+    parser.add_argument('--wall-file', help="export a wall saved by wall_file.save_wall instead of generating one")
+    parser.add_argument('--stats', help="write the generation timers and counters to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.wall_file:
+        with WallFile(args.wall_file) as wall_file:
+            _export_steps(wall_file.iter_build_steps(), args)
+        return
+    wall = Wall(args.width, args.height, BondType[args.bond], args.seed, args.stride_width, args.stride_height,
+                planner=args.planner, objective=args.objective, instrument=bool(args.stats))
+    _export_steps(iter_build_steps(wall), args)
+    if args.stats:
+        with open(args.stats, 'w') as file:
+            file.write(wall.stats.to_json(indent=2) + '\n')
+
+if __name__ == "__main__":
+    main()
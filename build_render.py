@@ -0,0 +1,228 @@
+"""Render walls and their build sequence to images and video without opening a window
+
+Usage: python build_render.py MANIFEST.jsonl --output-dir DIR [--wall NAME...] [--png] [--svg]
+                              [--frames] [--video] [--bricks-per-frame N] [--fps N]
+                              [--scale PIXELS_PER_MM] [--workers N]
+
+Every wall of the manifest (see brick_layer.py), or only the named ones, is drawn
+with the viewer's own drawing code on an off-screen surface, so bricks get the
+same stride colours, unbuilt grey and red problematic joints as in
+brick_layer_simulator.py:
+
+    --png      DIR/<name>.png, the finished wall
+    --svg      DIR/<name>.svg, the finished wall in mm
+    --frames   DIR/<name>/frame_000000.png and on, one frame per bricks-per-frame bricks
+    --video    DIR/<name>.mp4 at --fps frames per second, needs ffmpeg on the PATH
+
+Frames are drawn incrementally: every frame only draws its new bricks onto the
+surface of the frame before, like pressing ENTER in the viewer. Drawing takes
+tens of microseconds a frame, so encoding sets the pace: PNG frames are encoded in
+a process pool while the next frames are drawn, and video frames are piped to
+ffmpeg, which encodes them on threads of its own. --bricks-per-frame and a smaller
+--scale make fewer or smaller frames to encode.
+"""
+import argparse
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+import brick_layer_simulator as viewer
+from brick_layer import read_manifest, wall_options
+from wall_engine import generate_wall, to_mm
+
+FRAME_FORMAT = 'frame_{:06d}.png'
+DEFAULT_FPS = 60
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COMPRESSION_LEVEL = 1  # Three times faster than pygame's PNG encoder, at twice the file size
+MAX_PENDING_FRAMES_PER_WORKER = 4  # Frames waiting to be encoded, more only holds more frames in memory
+
+def show_wall(wall, built=None, scale=None):
+    """Draw a wall with the first built bricks of its build order built (all by default) and return the surface.
+
+    The viewer's module state is pointed at this wall, so viewer.build_next_brick
+    and viewer.draw_brick continue from here.
+    """
+    viewer.configure_view(wall.spec, scale)
+    viewer.wall = wall
+    viewer.built_bricks = bytearray(len(wall.bricks))
+    viewer.build_cursor = 0
+    if built is None:
+        built = len(wall.build_order)
+    while viewer.build_cursor < built and viewer.build_next_brick():
+        pass
+    surface = pygame.Surface((viewer.screen_width, viewer.screen_height))
+    surface.fill(viewer.BACKGROUND_COLOR)
+    viewer.draw_wall(surface)
+    return surface
+
+def iter_frames(wall, bricks_per_frame=1, scale=None):
+    """Yield the surface of the unbuilt wall and then after every bricks_per_frame bricks of the build order.
+
+    Every frame is the same surface with the new bricks drawn onto it, so use or
+    copy it before asking for the next one.
+    """
+    surface = show_wall(wall, 0, scale)
+    yield surface
+    while True:
+        added = 0
+        while added < bricks_per_frame and viewer.build_next_brick():
+            viewer.draw_brick(surface, wall.build_order[viewer.build_cursor - 1])
+            added += 1
+        if not added:
+            return
+        yield surface
+
+def save_png(wall, path, built=None, scale=None):
+    pygame.image.save(show_wall(wall, built, scale), path)
+
+def write_svg(wall, file, built=None):
+    """Write the wall as SVG in mm, with the first built bricks of its build order built (all by default)"""
+    bricks = wall.bricks
+    catalogue = wall.catalogue
+    height = wall.spec.height_tenths
+    course_height = catalogue.course_height_tenths
+    brick_height = to_mm(catalogue.height_tenths)
+    built_bricks = bytearray(len(bricks))
+    for brick_id in wall.build_order[:len(wall.build_order) if built is None else built]:
+        built_bricks[brick_id] = 1
+
+    def color(rgb):
+        return '#{:02x}{:02x}{:02x}'.format(*rgb)
+
+    def top(layer):
+        # The viewer lays course n between n and n + 1 course heights, with the bed joint below the brick
+        return to_mm(height - (layer + 1) * course_height)
+
+    file.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{wall.width_mm}mm" height="{wall.height_mm}mm" '
+               f'viewBox="0 0 {wall.width_mm} {wall.height_mm}">\n')
+    file.write(f'<rect width="100%" height="100%" fill="{color(viewer.BACKGROUND_COLOR)}"/>\n')
+    unbuilt = color(viewer.BRICK_COLOR_LIGHT_GREY)
+    stride_colors = [color(rgb) for rgb in viewer.STRIDE_COLORS]
+    for brick_id, (x, type_code, layer, stride) in enumerate(zip(bricks.x_tenths, bricks.type_code, bricks.layer,
+                                                                 bricks.stride)):
+        fill = stride_colors[stride % len(stride_colors)] if built_bricks[brick_id] else unbuilt
+        file.write(f'<rect x="{to_mm(x)}" y="{top(layer)}" width="{to_mm(bricks.lengths_by_code[type_code])}" '
+                   f'height="{brick_height}" fill="{fill}"/>\n')
+    problem = color(viewer.JOINT_PROBLEM_COLOR)
+    head_joint = catalogue.head_joint_tenths
+    for layer, joints in wall.problematic_joints.items():
+        for joint, _ in joints:
+            file.write(f'<rect x="{to_mm(joint - head_joint // 2)}" y="{top(layer)}" width="{to_mm(head_joint)}" '
+                       f'height="{brick_height}" fill="{problem}"/>\n')
+    file.write('</svg>\n')
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+def _encode_png(data, size, path):
+    """Write RGB frame bytes as a PNG, compressed lightly because encoding is what limits the frame rate"""
+    width, height = size
+    row_bytes = 3 * width
+    # Every row starts with its filter type, 0 is none
+    rows = b''.join(b'\x00' + data[row:row + row_bytes] for row in range(0, height * row_bytes, row_bytes))
+    with open(path, 'wb') as file:
+        file.write(PNG_SIGNATURE)
+        file.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        file.write(_png_chunk(b'IDAT', zlib.compress(rows, PNG_COMPRESSION_LEVEL)))
+        file.write(_png_chunk(b'IEND', b''))
+
+def write_frames(wall, directory, bricks_per_frame=1, scale=None, max_workers=None):
+    """Write the build sequence as numbered PNG frames, encoded in a process pool, and return the frame count"""
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    workers = max_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        max_pending = MAX_PENDING_FRAMES_PER_WORKER * workers
+        for surface in iter_frames(wall, bricks_per_frame, scale):
+            if len(pending) >= max_pending:
+                pending.popleft().result()
+            path = os.path.join(directory, FRAME_FORMAT.format(count))
+            pending.append(executor.submit(_encode_png, pygame.image.tobytes(surface, 'RGB'), surface.get_size(), path))
+            count += 1
+        for future in pending:
+            future.result()
+    return count
+
+def write_video(wall, path, fps=DEFAULT_FPS, bricks_per_frame=1, scale=None):
+    """Pipe the build sequence to ffmpeg as raw frames and return the frame count"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("Video export needs ffmpeg on the PATH, --frames writes PNG frames instead")
+    frames = iter_frames(wall, bricks_per_frame, scale)
+    surface = next(frames)
+    width, height = surface.get_size()
+    command = [
+        ffmpeg, '-loglevel', 'error', '-y',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+        # Most players only take even frame sizes for yuv420p
+        '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', path,
+    ]
+    count = 0
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as process:
+        try:
+            for surface in chain([surface], frames):
+                process.stdin.write(pygame.image.tobytes(surface, 'RGB'))
+                count += 1
+        finally:
+            process.stdin.close()
+    if process.returncode:
+        raise RuntimeError(f"ffmpeg failed with exit status {process.returncode}")
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('manifest', help="JSON lines file with one wall spec per line")
+    parser.add_argument('--output-dir', required=True)
+    parser.add_argument('--wall', action='append', help="only render this wall, can be repeated")
+    parser.add_argument('--png', action='store_true', help="write the finished wall as <name>.png")
+    parser.add_argument('--svg', action='store_true', help="write the finished wall as <name>.svg")
+    parser.add_argument('--frames', action='store_true', help="write the build sequence as <name>/frame_*.png")
+    parser.add_argument('--video', action='store_true', help="write the build sequence as <name>.mp4 with ffmpeg")
+    parser.add_argument('--bricks-per-frame', type=int, default=1)
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS)
+    parser.add_argument('--scale', type=float, help="pixels per mm, fitted to the viewer's window by default")
+    parser.add_argument('--workers', type=int, help="PNG encoding processes, all cores by default")
+    args = parser.parse_args(argv)
+    if not (args.png or args.svg or args.frames or args.video):
+        parser.error("nothing to render, pass --png, --svg, --frames or --video")
+
+    with open(args.manifest) as file:
+        specs = read_manifest(file)
+    if args.wall:
+        unknown = set(args.wall) - {spec['name'] for spec in specs}
+        if unknown:
+            parser.error(f"unknown walls {sorted(unknown)}")
+        specs = [spec for spec in specs if spec['name'] in args.wall]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    for spec in specs:
+        wall = generate_wall(**wall_options(spec))
+        name = spec['name']
+        if args.png:
+            save_png(wall, os.path.join(args.output_dir, f"{name}.png"), scale=args.scale)
+        if args.svg:
+            with open(os.path.join(args.output_dir, f"{name}.svg"), 'w') as file:
+                write_svg(wall, file)
+        if args.frames:
+            count = write_frames(wall, os.path.join(args.output_dir, name), args.bricks_per_frame, args.scale,
+                                 args.workers)
+            print(f"{name}: {count} frames", file=sys.stderr)
+        if args.video:
+            count = write_video(wall, os.path.join(args.output_dir, f"{name}.mp4"), args.fps,
+                                args.bricks_per_frame, args.scale)
+            print(f"{name}: {count} video frames", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
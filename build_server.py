@@ -0,0 +1,462 @@
+"""Asyncio server that streams planned build orders to robot controllers
+
+Usage: python build_server.py serve MANIFEST.jsonl [--host HOST] [--port PORT] [--window N]
+                                                   [--workers N] [--cache-dir DIR]
+       python build_server.py robot [--host HOST] [--port PORT] [--wall NAME] [--from-sequence N]
+                                    [--delay SECONDS] [--stop-after N]
+
+The walls of a manifest (see brick_layer.py) are planned in a process pool while
+the server already accepts connections. Clients speak JSON lines over TCP, one
+object per line with an "op":
+
+    {"op": "open", "wall": NAME, "from_sequence": N}   build a wall; without a name the
+                                                       next wall nobody is building
+    {"op": "ack", "sequence": N}                       brick N has been placed
+    {"op": "release"}                                  stop building the open wall
+    {"op": "watch", "wall": NAME}                      follow the progress of a wall
+    {"op": "walls"}                                    list the walls and their progress
+
+A controller that opens a wall gets {"op": "opened", ...} and then one
+{"op": "brick", ...} record per brick (the fields of build_export.iter_build_steps),
+never more than the window ahead of its acknowledgements, and {"op": "done"} once
+every brick is acknowledged. Bricks are acknowledged one at a time and in order.
+Progress survives a disconnect: opening the wall again resumes after the last
+acknowledged brick, or at from_sequence when the controller knows better. "idle"
+means every wall is built or being built.
+
+Watchers get {"op": "watching", "spec": ..., "placed": N} with the manifest entry
+of the wall (including its seed, so the same wall can be generated locally) and
+then {"op": "progress", "placed": N} whenever the number of placed bricks changes.
+A slow watcher only misses intermediate counts, it never holds up a controller.
+Any other request ends the watch.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from brick_layer import read_manifest, wall_options
+from build_export import build_step
+from wall_cache import decode_wall, generate_encoded_wall
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_WINDOW = 32  # Bricks a controller can be sent ahead of its acknowledgements
+CLOSE_TIMEOUT = 5.0  # Seconds to wait for the other side to close its end of a connection
+
+class ProtocolError(Exception):
+    pass
+
+class Connection:
+    """JSON lines over an asyncio stream pair"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.peer = writer.get_extra_info('peername')
+
+    async def send(self, message):
+        self.writer.write(json.dumps(message).encode() + b'\n')
+        # Waits while the client reads slower than we write
+        await self.writer.drain()
+
+    async def receive(self):
+        """Next message, or None once the other side has gone"""
+        try:
+            line = await self.reader.readline()
+        except ConnectionError:
+            return None
+        if not line:
+            return None
+        try:
+            message = json.loads(line)
+        except ValueError:
+            raise ProtocolError(f"not a JSON line: {line[:80]!r}")
+        if not isinstance(message, dict):
+            raise ProtocolError("messages must be JSON objects")
+        return message
+
+    async def close(self):
+        """Close once the other side has read everything sent to it.
+
+        Closing a socket with unread data resets the connection, and a reset can
+        drop messages the other side has not read yet, such as the last acks of a
+        controller that stops. So the write side is shut first and whatever else
+        arrives is read and dropped until the other side closes too.
+        """
+        try:
+            if self.writer.can_write_eof() and not self.writer.is_closing():
+                self.writer.write_eof()
+                await asyncio.wait_for(self._discard_until_eof(), CLOSE_TIMEOUT)
+        except (ConnectionError, asyncio.TimeoutError):
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def _discard_until_eof(self):
+        while await self.reader.read(2**16):
+            pass
+
+class WallJob:
+    """A wall on the server: its plan, how far it has been built and who is building and watching it"""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.spec = spec  # Manifest entry, with the seed the wall is generated with
+        self.wall = None
+        self.error = None
+        self.ready = asyncio.Event()  # Set once the wall is planned, or failed to
+        self.placed = 0  # Every brick before this sequence has been acknowledged
+        self.controller = None  # Connection building the wall
+        self.watchers = []  # Events of the watchers, set when placed changes
+
+    @property
+    def total(self):
+        return len(self.wall.build_order)
+
+    @property
+    def done(self):
+        return self.wall is not None and self.placed >= self.total
+
+    def set_placed(self, placed):
+        self.placed = placed
+        for changed in self.watchers:
+            changed.set()
+
+    def status(self):
+        return {
+            'wall': self.name,
+            'bricks': None if self.wall is None else self.total,
+            'placed': self.placed,
+            'building': self.controller is not None,
+            'error': self.error,
+        }
+
+class BuildServer:
+    """Serves the build orders of many walls to many controllers from one event loop.
+
+    Planning runs in a process pool, every connection is a task of its own and all
+    writes wait for the client to keep up, so no client can stall another.
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW, max_workers=None, cache_dir=None):
+        self.window = window
+        self.cache_dir = cache_dir
+        self.executor = ProcessPoolExecutor(max_workers=max_workers)
+        self.jobs = {}  # {name: WallJob}, in the order they were added
+        self.planning = []
+
+    def add_wall(self, spec):
+        """Start planning a manifest entry and return its job; it can be opened before it is planned"""
+        spec = dict(spec)
+        if spec['name'] in self.jobs:
+            raise ValueError(f"Wall names must be unique: {spec['name']}")
+        if spec.get('seed') is None:
+            # Watchers generate the wall again from its spec, so it needs the seed it is generated with
+            spec['seed'] = random.SystemRandom().getrandbits(64)
+        job = WallJob(spec['name'], spec)
+        self.jobs[job.name] = job
+        self.planning.append(asyncio.create_task(self._plan(job)))
+        return job
+
+    async def _plan(self, job):
+        loop = asyncio.get_running_loop()
+        try:
+            options = wall_options(job.spec)
+            data = await loop.run_in_executor(self.executor, _generate_wall, self.cache_dir, options)
+            job.wall = decode_wall(data, **options)
+            logger.info("Planned %s, %d bricks", job.name, job.total)
+        except Exception as error:
+            job.error = f"{type(error).__name__}: {error}"
+            logger.error("Planning %s failed: %s", job.name, job.error)
+        job.ready.set()
+
+    def close(self):
+        for task in self.planning:
+            task.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle_connection(self, reader, writer):
+        connection = Connection(reader, writer)
+        logger.info("Connection from %s", connection.peer)
+        try:
+            while True:
+                try:
+                    message = await connection.receive()
+                    if message is None:
+                        break
+                    await self._dispatch(connection, message)
+                except ProtocolError as error:
+                    await connection.send({'op': 'error', 'message': str(error)})
+        except ConnectionError:
+            pass
+        finally:
+            for job in self.jobs.values():
+                if job.controller is connection:
+                    job.controller = None
+            logger.info("%s disconnected", connection.peer)
+            await connection.close()
+
+    async def _dispatch(self, connection, message):
+        op = message.get('op')
+        if op == 'open':
+            await self._build(connection, message)
+        elif op == 'watch':
+            await self._watch(connection, message)
+        elif op == 'walls':
+            await connection.send({'op': 'walls', 'walls': [job.status() for job in self.jobs.values()]})
+        elif op in ('ack', 'release'):
+            raise ProtocolError(f"{op} without an open wall")
+        else:
+            raise ProtocolError(f"unknown op {op!r}")
+
+    def _job(self, name):
+        job = self.jobs.get(name)
+        if job is None:
+            raise ProtocolError(f"unknown wall {name!r}")
+        return job
+
+    async def _claim(self, connection, message):
+        """The job a controller asked for, claimed for it, or None when there is nothing to build"""
+        if message.get('wall') is not None:
+            job = self._job(message['wall'])
+            if job.controller is not None:
+                raise ProtocolError(f"wall {job.name!r} is being built by another controller")
+            job.controller = connection
+            await job.ready.wait()
+            return job
+        for job in self.jobs.values():
+            if job.controller is None and job.error is None and not job.done:
+                job.controller = connection
+                await job.ready.wait()
+                if job.error is None and not job.done:
+                    return job
+                job.controller = None
+        return None
+
+    async def _build(self, connection, message):
+        job = await self._claim(connection, message)
+        if job is None:
+            await connection.send({'op': 'idle'})
+            return
+        try:
+            if job.error is not None:
+                raise ProtocolError(f"wall {job.name!r} could not be planned: {job.error}")
+            await self._stream(connection, job, message.get('from_sequence'))
+        finally:
+            if job.controller is connection:
+                job.controller = None
+
+    async def _stream(self, connection, job, from_sequence):
+        wall = job.wall
+        build_order = wall.build_order
+        total = job.total
+        if from_sequence is not None:
+            # The controller knows which bricks it actually placed
+            job.set_placed(max(0, min(int(from_sequence), total)))
+        sent = job.placed
+        await connection.send({'op': 'opened', 'wall': job.name, 'bricks': total,
+                               'next_sequence': sent, 'window': self.window})
+
+        # Bricks are sent from a task of their own, so acks are read as they arrive: a send
+        # that fails on a dropped connection can't lose the acks that came in before it
+        acked = asyncio.Event()
+
+        async def send_bricks():
+            nonlocal sent
+            try:
+                while sent < total:
+                    while sent < total and sent - job.placed < self.window:
+                        step = build_step(wall, sent, build_order[sent])
+                        await connection.send({'op': 'brick', 'wall': job.name, **step, 'type': step['type'].name})
+                        sent += 1
+                    await acked.wait()
+                    acked.clear()
+            except ConnectionError:
+                pass  # Noticed by the ack reader once it has read what is left
+
+        sending = asyncio.create_task(send_bricks())
+        try:
+            while job.placed < total:
+                try:
+                    message = await connection.receive()
+                    if message is None:
+                        raise ConnectionError("controller disconnected")
+                    op = message.get('op')
+                    if op == 'release':
+                        sending.cancel()
+                        await connection.send({'op': 'released', 'wall': job.name, 'next_sequence': job.placed})
+                        return
+                    if op != 'ack':
+                        raise ProtocolError(f"expected an ack for brick {job.placed}, got {op!r}")
+                    sequence = message.get('sequence')
+                    if not isinstance(sequence, int) or sequence >= sent:
+                        raise ProtocolError(f"ack for brick {sequence!r}, which was not sent")
+                    if sequence > job.placed:
+                        raise ProtocolError(f"ack for brick {sequence} before brick {job.placed}")
+                    if sequence == job.placed:
+                        job.set_placed(sequence + 1)
+                        acked.set()
+                    # Older sequences are repeated acks after a resume and change nothing
+                except ProtocolError as error:
+                    # The wall stays open, the controller can still ack the right brick
+                    await connection.send({'op': 'error', 'wall': job.name, 'message': str(error)})
+            await sending
+        finally:
+            sending.cancel()
+
+        await connection.send({'op': 'done', 'wall': job.name, 'bricks': total})
+
+    async def _watch(self, connection, message):
+        job = self._job(message.get('wall'))
+        await job.ready.wait()
+        if job.error is not None:
+            raise ProtocolError(f"wall {job.name!r} could not be planned: {job.error}")
+        changed = asyncio.Event()
+        job.watchers.append(changed)
+        # Any other request ends the watch
+        receiving = asyncio.create_task(connection.receive())
+        try:
+            await connection.send({'op': 'watching', 'wall': job.name, 'spec': job.spec,
+                                   'bricks': job.total, 'placed': job.placed})
+            while True:
+                waiting = asyncio.create_task(changed.wait())
+                finished, _ = await asyncio.wait((waiting, receiving), return_when=asyncio.FIRST_COMPLETED)
+                if receiving in finished:
+                    waiting.cancel()
+                    message = receiving.result()
+                    if message is not None:
+                        await self._dispatch(connection, message)
+                    return
+                # Only the latest count is sent, counts that changed in the meantime are skipped
+                changed.clear()
+                await connection.send({'op': 'progress', 'wall': job.name, 'placed': job.placed})
+        finally:
+            job.watchers.remove(changed)
+            receiving.cancel()
+
+def _generate_wall(cache_dir, options):
+    return generate_encoded_wall(cache_dir, **options)
+
+async def serve(specs, host=DEFAULT_HOST, port=DEFAULT_PORT, window=DEFAULT_WINDOW, max_workers=None,
+                cache_dir=None, started=None):
+    """Plan the walls of specs and serve them until cancelled; started is called with the listening server"""
+    build_server = BuildServer(window, max_workers, cache_dir)
+    try:
+        for spec in specs:
+            build_server.add_wall(spec)
+        server = await asyncio.start_server(build_server.handle_connection, host, port)
+        async with server:
+            if started is not None:
+                started(server)
+            await server.serve_forever()
+    finally:
+        build_server.close()
+
+async def run_robot(host=DEFAULT_HOST, port=DEFAULT_PORT, wall=None, from_sequence=None, delay=0.0,
+                    stop_after=None):
+    """Stand-in robot controller: build walls from a server, acknowledging every brick after delay seconds.
+
+    Builds the named wall, or every wall nobody else is building. With stop_after the
+    connection is dropped after that many bricks, like a controller losing its link.
+    Returns {wall: bricks placed by this controller}.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    connection = Connection(reader, writer)
+    placed = {}
+    try:
+        while True:
+            await connection.send({'op': 'open', 'wall': wall, 'from_sequence': from_sequence})
+            message = await connection.receive()
+            if message is None or message['op'] == 'idle':
+                return placed
+            if message['op'] == 'error':
+                raise RuntimeError(message['message'])
+            name = message['wall']
+            placed.setdefault(name, 0)
+            while True:
+                message = await connection.receive()
+                if message is None:
+                    raise ConnectionError("server disconnected")
+                if message['op'] == 'done':
+                    break
+                if message['op'] == 'error':
+                    raise RuntimeError(message['message'])
+                if delay:
+                    await asyncio.sleep(delay)
+                await connection.send({'op': 'ack', 'sequence': message['sequence']})
+                placed[name] += 1
+                if stop_after is not None and sum(placed.values()) >= stop_after:
+                    return placed
+            if wall is not None:
+                return placed
+            from_sequence = None
+    finally:
+        await connection.close()
+
+async def watch_wall(host, port, wall, on_message):
+    """Follow a wall on a server, calling on_message with every message until the server goes away"""
+    reader, writer = await asyncio.open_connection(host, port)
+    connection = Connection(reader, writer)
+    try:
+        await connection.send({'op': 'watch', 'wall': wall})
+        while True:
+            message = await connection.receive()
+            if message is None:
+                return
+            on_message(message)
+            if message['op'] == 'error':
+                return
+    finally:
+        await connection.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help="plan the walls of a manifest and serve their build orders")
+    serve_parser.add_argument('manifest', help="JSON lines file with one wall spec per line")
+    serve_parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                              help="bricks sent ahead of a controller's acknowledgements")
+    serve_parser.add_argument('--workers', type=int, help="planning processes, all cores by default")
+    serve_parser.add_argument('--cache-dir', help="reuse walls generated with the same options from this directory")
+
+    robot_parser = subparsers.add_parser('robot', help="stand-in robot controller that acknowledges every brick")
+    robot_parser.add_argument('--wall', help="build this wall, every free wall by default")
+    robot_parser.add_argument('--from-sequence', type=int, help="resume at this brick instead of the server's count")
+    robot_parser.add_argument('--delay', type=float, default=0.0, help="seconds to place a brick")
+    robot_parser.add_argument('--stop-after', type=int, help="disconnect after placing this many bricks")
+
+    for command in (serve_parser, robot_parser):
+        command.add_argument('--host', default=DEFAULT_HOST)
+        command.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(name)s: %(message)s")
+
+    if args.command == 'serve':
+        with open(args.manifest) as file:
+            specs = read_manifest(file)
+        started = lambda server: logger.info("Serving %d walls on %s", len(specs),
+                                             ", ".join(str(sock.getsockname()) for sock in server.sockets))
+        try:
+            asyncio.run(serve(specs, args.host, args.port, args.window, args.workers, args.cache_dir, started))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    placed = asyncio.run(run_robot(args.host, args.port, args.wall, args.from_sequence, args.delay, args.stop_after))
+    for name, count in placed.items():
+        print(f"{name}: placed {count} bricks", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
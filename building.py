@@ -0,0 +1,123 @@
+"""Buildings: walls that meet at corners, generated together
+
+A building is a set of walls, each given by its generate_wall options, and the
+corners where the end of one wall meets the end of another:
+
+    walls = {
+        'north': {'width_mm': 8000, 'height_mm': 2600, 'bond_type': BondType.WILD, 'seed': 1},
+        'east': {'width_mm': 5000, 'height_mm': 2600, 'bond_type': BondType.WILD, 'seed': 2},
+    }
+    corners = [(('north', 'end'), ('east', 'start'))]
+
+Walls are measured along their outside faces, so at a corner both reach the outer
+corner. In every course one wall runs through the corner and the other butts
+against it, alternating from course to course so the corner interlocks. At the start
+of a wall the courses that begin with a drieklezoor (or a full brick) run through;
+in the others the end of the other wall's brick takes the place of the half brick.
+At the end of a wall a butting course stops a brick width short of the corner.
+
+Only the course parities are solved jointly, see solve_corners. After that every
+wall is independent, so the walls are generated in a process pool and can be
+cached like any other wall.
+"""
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from wall_cache import decode_wall, generate_encoded_wall
+from wall_engine import WALL_HEIGHT, WALL_WIDTH, Corner, WallSpec
+
+WALL_ENDS = ('start', 'end')
+
+def wall_spec_from_options(options):
+    """WallSpec of the wall generate_wall would generate with options"""
+    return WallSpec(options.get('width_mm', WALL_WIDTH), options.get('height_mm', WALL_HEIGHT),
+                    options.get('openings', ()), options.get('catalogue'))
+
+def solve_corners(specs, corners):
+    """Course offset and corners of every wall, so all corners interlock.
+
+    specs maps wall names to WallSpecs, corners is a list of ((name, end), (name, end))
+    pairs with end "start" or "end". Returns {name: (course_offset, (start corner, end corner))}.
+
+    A wall butts at its start in the courses laid by the odd course rules, so it is
+    the course offset of a wall that decides its start. Two starts that meet need
+    opposite offsets, which makes the corners a two colouring problem over the walls;
+    a start meeting an end, or two ends, can always follow.
+    """
+    used = set()
+    for corner in corners:
+        for name, end in corner:
+            if name not in specs:
+                raise ValueError(f"Corner {corner} names an unknown wall {name!r}")
+            if end not in WALL_ENDS:
+                raise ValueError(f"Corner {corner} has an unknown wall end {end!r}")
+            if (name, end) in used:
+                raise ValueError(f"The {end} of wall {name!r} is part of more than one corner")
+            used.add((name, end))
+        (name_a, _), (name_b, _) = corner
+        if specs[name_a].catalogue.course_height_tenths != specs[name_b].catalogue.course_height_tenths:
+            raise ValueError(f"Walls {name_a!r} and {name_b!r} meet at a corner but have different course heights")
+
+    # Two colour the walls along the corners where two starts meet
+    neighbours = {name: [] for name in specs}
+    for (name_a, end_a), (name_b, end_b) in corners:
+        if end_a == end_b == 'start':
+            neighbours[name_a].append(name_b)
+            neighbours[name_b].append(name_a)
+    offsets = {}
+    for first in specs:
+        if first in offsets:
+            continue
+        offsets[first] = 0
+        pending = deque([first])
+        while pending:
+            name = pending.popleft()
+            for other in neighbours[name]:
+                if other not in offsets:
+                    offsets[other] = 1 - offsets[name]
+                    pending.append(other)
+                elif offsets[other] == offsets[name]:
+                    raise ValueError(f"The starts of walls {name!r} and {other!r} can't both interlock, "
+                                     f"an odd ring of walls meets start to start")
+
+    wall_corners = {name: [None, None] for name in specs}
+    for (name_a, end_a), (name_b, end_b) in corners:
+        courses = min(specs[name_a].num_layers, specs[name_b].num_layers)
+        if end_a == 'end' and end_b == 'start':
+            (name_a, end_a), (name_b, end_b) = (name_b, end_b), (name_a, end_a)
+        if end_a == 'start':
+            # Butting at a start follows from the course offset, the other end butts in between
+            butt_a = (1 + offsets[name_a]) % 2
+        else:
+            butt_a = 1
+        wall_corners[name_a][WALL_ENDS.index(end_a)] = Corner(butt_a, courses)
+        wall_corners[name_b][WALL_ENDS.index(end_b)] = Corner(1 - butt_a, courses)
+    return {name: (offsets[name], tuple(wall_corners[name])) for name in specs}
+
+def building_wall_options(walls, corners):
+    """generate_wall options of every wall of a building, with the course offsets and corners filled in"""
+    solved = solve_corners({name: wall_spec_from_options(options) for name, options in walls.items()}, corners)
+    return {
+        name: {**options, 'course_offset': solved[name][0], 'corners': solved[name][1]}
+        for name, options in walls.items()
+    }
+
+def generate_building(walls, corners, max_workers=None, cache_dir=None):
+    """Generate every wall of a building and return {name: Wall}.
+
+    Walls are generated in a process pool. With cache_dir, walls that were generated
+    before with the same options and corners are loaded from that cache instead.
+    """
+    options = building_wall_options(walls, corners)
+    for wall_options in options.values():
+        # Walls are rebuilt from their options here, so each needs the seed it is generated with
+        if wall_options.get('seed') is None:
+            wall_options['seed'] = random.SystemRandom().getrandbits(64)
+    if max_workers == 1 or len(options) <= 1:
+        return {name: decode_wall(generate_encoded_wall(cache_dir, **wall_options), **wall_options)
+                for name, wall_options in options.items()}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(generate_encoded_wall, cache_dir, **wall_options)
+                   for name, wall_options in options.items()}
+        return {name: decode_wall(futures[name].result(), **options[name]) for name in options}
@@ -0,0 +1,192 @@
+"""What-if sweeps over stride sizes, bonds and seeds, for sizing robot platforms
+
+Usage: python stride_sweep.py MANIFEST.jsonl --stride-width MM... --stride-height MM...
+                              [--bond NAME...] [--seed N...] [--workers N] [--output FILE]
+                              [--brick-time S] [--move-time S] [--travel-speed MM_PER_S]
+
+Every wall of the manifest (see brick_layer.py) is generated once per bond and
+seed, NORMAL and FLEMISH walls only once as they don't depend on the seed, and
+then evaluated for every combination of stride width and height. Walls don't
+depend on the stride size, so only the stride assignment of the grid planner (see
+calculate_build_order) is redone per stride size. Each course keeps its brick
+centres sorted, so the number of bricks in a stride is the difference of two
+bisections instead of a pass over the bricks.
+
+Every evaluation is written as a JSON line with the number of strides that hold
+bricks, bricks per stride, platform moves and travel, and a cycle time estimated
+with a CycleModel; a summary per bond and stride size follows on stderr.
+"""
+import argparse
+import json
+import math
+import sys
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+
+from brick_layer import read_manifest, wall_options
+from wall_engine import BondType, generate_wall, to_tenths
+
+# Seconds to lay one brick, seconds per platform move and platform speed in mm per second
+CycleModel = namedtuple('CycleModel', 'brick_s move_s travel_mm_per_s')
+# Rough figures for a single arm on a mobile platform, measure a real robot to compare platforms
+DEFAULT_CYCLE_MODEL = CycleModel(brick_s=12.0, move_s=45.0, travel_mm_per_s=150.0)
+
+def course_centres(wall):
+    """Doubled centre height and sorted doubled centres along the course of every course, in tenths of a mm.
+
+    Doubled, like in calculate_build_order, so a brick's centre is an integer.
+    """
+    bricks = wall.bricks
+    lengths_by_code = bricks.lengths_by_code
+    course_height = wall.catalogue.course_height_tenths
+    centres = []
+    for course in wall.layers:
+        if not course:
+            continue
+        xs = sorted(2 * bricks.x_tenths[brick_id] + lengths_by_code[bricks.type_code[brick_id]] for brick_id in course)
+        centres.append((2 * bricks.y_tenths[course.start] + course_height, xs))
+    return centres
+
+def evaluate_strides(wall, centres, stride_width, stride_height, model=DEFAULT_CYCLE_MODEL):
+    """Strides, bricks per stride, moves, travel and cycle time of the grid build order with other stride sizes.
+
+    centres comes from course_centres(wall). The counts are the ones calculate_build_order
+    and build_order_stats would give the wall with this stride width and height.
+    """
+    horizontal_strides = math.ceil(wall.width_mm / stride_width)
+    vertical_strides = math.ceil(wall.height_mm / stride_height)
+    double_stride_width = 2 * to_tenths(stride_width)
+    double_stride_height = 2 * to_tenths(stride_height)
+
+    counts = [0] * (horizontal_strides * vertical_strides)
+    for y_centre, xs in centres:
+        row_start = min(y_centre // double_stride_height, vertical_strides - 1) * horizontal_strides
+        below = 0
+        for column in range(horizontal_strides - 1):
+            # A closer sticking out past the wall end stays in the last stride
+            end = bisect_left(xs, (column + 1) * double_stride_width)
+            counts[row_start + column] += end - below
+            below = end
+        counts[row_start + horizontal_strides - 1] += len(xs) - below
+
+    # The grid planner lays the strides bottom to top and left to right, each in one go
+    used = [stride for stride, count in enumerate(counts) if count]
+    travel_mm = 0.0
+    for previous, stride in zip(used, used[1:]):
+        travel_mm += math.hypot((stride % horizontal_strides - previous % horizontal_strides) * stride_width,
+                                (stride // horizontal_strides - previous // horizontal_strides) * stride_height)
+    bricks = sum(counts)
+    per_stride = [counts[stride] for stride in used]
+    moves = max(len(used) - 1, 0)
+    cycle_time_s = bricks * model.brick_s + moves * model.move_s + travel_mm / model.travel_mm_per_s
+    return {
+        'stride_width': stride_width,
+        'stride_height': stride_height,
+        'strides': len(used),
+        'bricks': bricks,
+        'bricks_per_stride': {
+            'min': min(per_stride, default=0),
+            'mean': round(bricks / len(used), 3) if used else 0,
+            'max': max(per_stride, default=0),
+        },
+        'stride_moves': moves,
+        'travel_mm': round(travel_mm, 3),
+        'cycle_time_s': round(cycle_time_s, 3),
+    }
+
+def sweep_wall(spec, bond_type, seed, stride_sizes, model=DEFAULT_CYCLE_MODEL):
+    """Generate one wall of a manifest with a bond and seed and evaluate it for every (width, height) stride size.
+
+    The wall is planned with the grid planner whatever the spec says, the sweep only
+    evaluates grid strides.
+    """
+    options = wall_options(spec)
+    options.update(bond_type=bond_type, seed=seed, planner="grid")
+    wall = generate_wall(**options)
+    centres = course_centres(wall)
+    return [
+        {'name': spec['name'], 'bond': bond_type.name, 'seed': seed,
+         **evaluate_strides(wall, centres, stride_width, stride_height, model)}
+        for stride_width, stride_height in stride_sizes
+    ]
+
+def sweep(specs, stride_widths, stride_heights, bonds=tuple(BondType), seeds=(0,), model=DEFAULT_CYCLE_MODEL,
+          max_workers=None):
+    """Evaluate every wall, bond, seed and stride size in a process pool, yielding rows as walls finish.
+
+    Each worker generates a wall once for its bond and seed and evaluates all stride
+    sizes on it. NORMAL and FLEMISH walls are the same for every seed, so they are
+    evaluated once, with None as their seed.
+    """
+    stride_sizes = list(product(stride_widths, stride_heights))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(sweep_wall, spec, bond_type, seed, stride_sizes, model)
+            for spec, bond_type in product(specs, bonds)
+            for seed in (seeds if bond_type == BondType.WILD else (None,))
+        ]
+        for future in as_completed(futures):
+            yield from future.result()
+
+def summarize(rows):
+    """Totals per bond and stride size over all walls and seeds, fastest first within a bond"""
+    totals = {}
+    for row in rows:
+        key = (row['bond'], row['stride_width'], row['stride_height'])
+        total = totals.setdefault(key, {'bond': key[0], 'stride_width': key[1], 'stride_height': key[2],
+                                        'walls': 0, 'strides': 0, 'bricks': 0, 'cycle_time_s': 0.0})
+        total['walls'] += 1
+        total['strides'] += row['strides']
+        total['bricks'] += row['bricks']
+        total['cycle_time_s'] += row['cycle_time_s']
+    for total in totals.values():
+        total['bricks_per_stride'] = round(total['bricks'] / total['strides'], 3) if total['strides'] else 0
+        total['cycle_time_s'] = round(total['cycle_time_s'], 3)
+    return sorted(totals.values(), key=lambda total: (total['bond'], total['cycle_time_s']))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('manifest', help="JSON lines file with one wall spec per line")
+    parser.add_argument('--stride-width', type=float, nargs='+', required=True, help="stride widths in mm")
+    parser.add_argument('--stride-height', type=float, nargs='+', required=True, help="stride heights in mm")
+    parser.add_argument('--bond', choices=[bond.name for bond in BondType], nargs='+',
+                        help="bonds to compare, all by default")
+    parser.add_argument('--seed', type=int, nargs='+', default=[0], help="seeds of every wall")
+    parser.add_argument('--workers', type=int, help="worker processes, all cores by default")
+    parser.add_argument('--output', help="write the rows to this file instead of stdout")
+    parser.add_argument('--brick-time', type=float, default=DEFAULT_CYCLE_MODEL.brick_s,
+                        help="seconds to lay one brick")
+    parser.add_argument('--move-time', type=float, default=DEFAULT_CYCLE_MODEL.move_s,
+                        help="seconds per platform move, on top of the travel")
+    parser.add_argument('--travel-speed', type=float, default=DEFAULT_CYCLE_MODEL.travel_mm_per_s,
+                        help="platform speed in mm per second")
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as file:
+        specs = read_manifest(file)
+    bonds = [BondType[name] for name in args.bond] if args.bond else list(BondType)
+    model = CycleModel(args.brick_time, args.move_time, args.travel_speed)
+    # Whole millimetres read back as integers, like in the manifest
+    stride_widths = [int(value) if value.is_integer() else value for value in args.stride_width]
+    stride_heights = [int(value) if value.is_integer() else value for value in args.stride_height]
+
+    rows = []
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for row in sweep(specs, stride_widths, stride_heights, bonds, args.seed, model, args.workers):
+            output.write(json.dumps(row) + '\n')
+            rows.append(row)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    for total in summarize(rows):
+        print(f"{total['bond']} {total['stride_width']}x{total['stride_height']}: {total['strides']} strides, "
+              f"{total['bricks_per_stride']} bricks per stride, {total['cycle_time_s'] / 3600:.2f} h "
+              f"over {total['walls']} walls", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
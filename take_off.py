@@ -0,0 +1,214 @@
+"""Material take-off and cutting plans of planned walls
+
+Halves and drieklezoors are not bought, they are sawn from full bricks on site.
+wall_take_off turns a planned wall into a pallet list per stride: the bricks the
+platform lays from that stride in build order, the full bricks to load, which
+pieces to saw from them and the waste that leaves. The wall and project totals
+are what has to be ordered.
+
+No pass over the bricks is needed for the counts: the brick table keeps a tally
+per course and the build order planners one per stride, and plan_cuts works on
+those counts. Only the order on each pallet is read from the build order.
+
+plan_cuts packs the pieces of a pallet into full bricks longest first, every piece
+into the offcut it fits tightest (best fit decreasing), with a saw kerf lost at every
+cut. Identical pieces and offcuts are packed in groups, so packing takes a few steps
+per piece length rather than per piece. Offcuts stay on their pallet.
+"""
+from collections import Counter
+
+from wall_engine import BrickType, brick_counts, stride_brick_counts, to_mm, to_tenths
+
+SAW_KERF = 4  # mm of brick a masonry saw blade turns into dust per cut
+CUT_TYPES = (BrickType.HALF, BrickType.DRIEKLEZOOR)  # Brick types sawn from full bricks
+
+def _cut_pieces(offcut, length, saw_kerf, limit):
+    """Saw up to limit pieces of length from an offcut, return the pieces, the saw cuts and what is left of it"""
+    pieces = cuts = 0
+    while pieces < limit and offcut >= length:
+        pieces += 1
+        if offcut > length:
+            cuts += 1
+            offcut = max(offcut - length - saw_kerf, 0)
+        else:
+            offcut = 0
+    return pieces, cuts, offcut
+
+class CutPlan:
+    """Full bricks to saw into halves and drieklezoors, grouped by the pieces sawn from them"""
+
+    def __init__(self, catalogue, saw_kerf=SAW_KERF):
+        self.catalogue = catalogue
+        self.saw_kerf = saw_kerf
+        # {(offcut left in tenths, BrickTypes of the pieces, saw cuts): full bricks}
+        self.patterns = Counter()
+
+    @property
+    def full_bricks(self):
+        return sum(self.patterns.values())
+
+    @property
+    def saw_cuts(self):
+        return sum(cuts * count for (_, _, cuts), count in self.patterns.items())
+
+    @property
+    def waste_tenths(self):
+        """Length of the full bricks that doesn't end up in a piece: offcuts and saw kerf"""
+        lengths = self.catalogue.lengths_tenths
+        return sum((self.catalogue.full_tenths - sum(lengths[piece] for piece in pieces)) * count
+                   for (_, pieces, _), count in self.patterns.items())
+
+    def pieces(self):
+        """Pieces sawn per BrickType"""
+        counts = dict.fromkeys(CUT_TYPES, 0)
+        for (_, pieces, _), count in self.patterns.items():
+            for piece in pieces:
+                counts[piece] += count
+        return counts
+
+    def add(self, brick_type, count):
+        """Pack count pieces of a brick type, into existing offcuts where they fit and new full bricks otherwise.
+
+        Pieces are packed best fit, so add the longest brick type first.
+        """
+        length = self.catalogue.lengths_tenths[brick_type]
+        saw_kerf = to_tenths(self.saw_kerf)
+        patterns = self.patterns
+        while count:
+            fitting = [pattern for pattern in patterns if pattern[0] >= length]
+            if fitting:
+                pattern = min(fitting)
+                bricks = patterns.pop(pattern)
+                offcut, pieces, cuts = pattern
+            else:
+                pattern = None
+                bricks = count  # New full bricks, at most one per piece
+                offcut, pieces, cuts = self.catalogue.full_tenths, (), 0
+
+            # The bricks of a group are alike, so all but the last one get the same pieces
+            per_brick, new_cuts, left = _cut_pieces(offcut, length, saw_kerf, count)
+            filled = min(bricks, count // per_brick)
+            if filled:
+                patterns[(left, pieces + (brick_type,) * per_brick, cuts + new_cuts)] += filled
+                count -= filled * per_brick
+                bricks -= filled
+            if count and bricks:
+                sawn, new_cuts, left = _cut_pieces(offcut, length, saw_kerf, count)
+                patterns[(left, pieces + (brick_type,) * sawn, cuts + new_cuts)] += 1
+                count -= sawn
+                bricks -= 1
+            if pattern is not None and bricks:
+                patterns[pattern] += bricks
+
+    def as_dict(self):
+        return {
+            'full_bricks': self.full_bricks,
+            'pieces': {brick_type.name: count for brick_type, count in self.pieces().items()},
+            'saw_cuts': self.saw_cuts,
+            'waste_mm': to_mm(self.waste_tenths),
+            'cuts': [
+                {'pieces': [piece.name for piece in pieces], 'full_bricks': count, 'offcut_mm': to_mm(offcut)}
+                for (offcut, pieces, _), count in sorted(self.patterns.items(), key=lambda item: -item[1])
+            ],
+        }
+
+def plan_cuts(counts, catalogue, saw_kerf=SAW_KERF):
+    """Cut plan for the halves and drieklezoors of counts, a dictionary of BrickType to bricks"""
+    plan = CutPlan(catalogue, saw_kerf)
+    for brick_type in sorted(CUT_TYPES, key=lambda brick_type: -catalogue.lengths_tenths[brick_type]):
+        plan.add(brick_type, counts[brick_type])
+    return plan
+
+class Pallet:
+    """The bricks laid from one stride and the full bricks to load for them"""
+
+    def __init__(self, stride, stride_x, stride_y, counts, sequences, cut_plan):
+        self.stride = stride
+        self.stride_x = stride_x
+        self.stride_y = stride_y
+        self.counts = counts  # Bricks per BrickType
+        self.sequences = sequences  # Build order positions of the bricks, in order
+        self.cut_plan = cut_plan
+
+    @property
+    def full_bricks(self):
+        """Full bricks to load, laid whole or sawn"""
+        return self.counts[BrickType.FULL] + self.cut_plan.full_bricks
+
+    def as_dict(self, wall):
+        type_code = wall.bricks.type_code
+        build_order = wall.build_order
+        return {
+            'stride': self.stride,
+            'stride_x': self.stride_x,
+            'stride_y': self.stride_y,
+            'bricks_by_type': {brick_type.name: count for brick_type, count in self.counts.items()},
+            'full_bricks': self.full_bricks,
+            'cut_plan': self.cut_plan.as_dict(),
+            # [build sequence, brick type] of every brick, the first one laid goes on top
+            'order': [[sequence, BrickType(type_code[build_order[sequence]]).name] for sequence in self.sequences],
+        }
+
+class TakeOff:
+    """Bricks and cutting plans of a planned wall, pallet by pallet"""
+
+    def __init__(self, wall, counts, pallets, saw_kerf):
+        self.wall = wall
+        self.counts = counts  # Bricks per BrickType in the wall
+        self.pallets = pallets  # In the order the platform first stands at their stride
+        self.saw_kerf = saw_kerf
+
+    @property
+    def full_bricks(self):
+        return sum(pallet.full_bricks for pallet in self.pallets)
+
+    @property
+    def saw_cuts(self):
+        return sum(pallet.cut_plan.saw_cuts for pallet in self.pallets)
+
+    @property
+    def waste_tenths(self):
+        return sum(pallet.cut_plan.waste_tenths for pallet in self.pallets)
+
+    def as_dict(self, pallets=False):
+        """Totals of the wall, with every pallet list if pallets is set"""
+        take_off = {
+            'bricks_by_type': {brick_type.name: count for brick_type, count in self.counts.items()},
+            'full_bricks': self.full_bricks,
+            'saw_cuts': self.saw_cuts,
+            'waste_mm': to_mm(self.waste_tenths),
+            'saw_kerf_mm': self.saw_kerf,
+            'pallets': len(self.pallets),
+        }
+        if pallets:
+            take_off['pallet_list'] = [pallet.as_dict(self.wall) for pallet in self.pallets]
+        return take_off
+
+def wall_take_off(wall, saw_kerf=SAW_KERF):
+    """Take-off of a planned wall with a pallet for every stride that bricks are laid from"""
+    catalogue = wall.catalogue
+    horizontal_strides = wall.horizontal_strides
+    stride = wall.bricks.stride
+    sequences = {}
+    for sequence, brick_id in enumerate(wall.build_order):
+        sequences.setdefault(stride[brick_id], []).append(sequence)
+
+    pallets = []
+    for pallet_stride, pallet_sequences in sequences.items():
+        counts = stride_brick_counts(wall, pallet_stride)
+        pallets.append(Pallet(pallet_stride, pallet_stride % horizontal_strides, pallet_stride // horizontal_strides,
+                              counts, pallet_sequences, plan_cuts(counts, catalogue, saw_kerf)))
+    return TakeOff(wall, brick_counts(wall), pallets, saw_kerf)
+
+def project_take_off(take_offs):
+    """Totals over the as_dict() take-offs of the walls of a project"""
+    project = {'walls': 0, 'bricks_by_type': dict.fromkeys((brick_type.name for brick_type in BrickType), 0),
+               'full_bricks': 0, 'saw_cuts': 0, 'waste_mm': 0, 'pallets': 0}
+    for take_off in take_offs:
+        project['walls'] += 1
+        for name, count in take_off['bricks_by_type'].items():
+            project['bricks_by_type'][name] += count
+        for key in ('full_bricks', 'saw_cuts', 'waste_mm', 'pallets'):
+            project[key] += take_off[key]
+    project['waste_mm'] = round(project['waste_mm'], 1)
+    return project
@@ -0,0 +1,35 @@
+import asyncio
+
+from build_server import BuildServer, run_robot
+
+SPEC = {'name': 'north', 'width_mm': 2300, 'height_mm': 2000, 'bond': 'NORMAL'}
+
+async def _resume(stop_after, window):
+    build_server = BuildServer(window, max_workers=1)
+    server = await asyncio.start_server(build_server.handle_connection, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        job = build_server.add_wall(SPEC)
+        await job.ready.wait()
+        first = await run_robot(port=port, wall='north', stop_after=stop_after)
+        # The server notices the dropped connection after it has read every ack the robot sent
+        for _ in range(100):
+            if job.controller is None:
+                break
+            await asyncio.sleep(0.01)
+        placed_before_resume = job.placed
+        second = await run_robot(port=port, wall='north')
+        return job.total, first['north'], placed_before_resume, second['north'], job.placed
+    finally:
+        server.close()
+        await server.wait_closed()
+        build_server.close()
+
+def test_resume_after_disconnect_keeps_every_ack():
+    for stop_after, window in ((50, 32), (10, 4), (2, 32), (100, 8)):
+        total, first, placed_before_resume, second, placed = asyncio.run(_resume(stop_after, window))
+        assert first == stop_after
+        assert placed_before_resume == stop_after
+        # Resuming without from_sequence sends only the bricks that were not acknowledged
+        assert second == total - stop_after
+        assert placed == total
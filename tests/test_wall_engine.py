@@ -0,0 +1,20 @@
+from wall_engine import BondType, Opening, build_order_stats, generate_wall, regenerate_wall
+
+def _lays_every_brick_once(wall):
+    return sorted(wall.build_order) == list(range(len(wall.bricks)))
+
+def test_reach_planner_moves_past_a_stride_row_emptied_by_an_opening():
+    # The opening takes the whole width of the second stride row, so nothing is ready next to the first one
+    options = dict(bond_type=BondType.NORMAL, seed=1, planner='reach', openings=[Opening(0, 1250, 2300, 1400)])
+    for objective in ('moves', 'travel'):
+        wall = generate_wall(2300, 4000, objective=objective, **options)
+        assert _lays_every_brick_once(wall)
+        assert build_order_stats(wall)['support_violations'] == 0
+        regenerate_wall(wall, height_mm=3500)
+        assert _lays_every_brick_once(wall)
+
+def test_reach_planner_on_an_empty_wall():
+    for width_mm, height_mm in ((0, 4126), (2300, 0)):
+        wall = generate_wall(width_mm, height_mm, planner='reach')
+        assert len(wall.bricks) == 0
+        assert len(wall.build_order) == 0
@@ -0,0 +1,236 @@
+"""Content-addressed cache of generated walls and their build orders
+
+A wall is a pure function of its generation options, including its openings and
+brick catalogue, as long as its random choices are seeded. Such walls are stored under a hash of those
+inputs, in memory and optionally on disk, both with a size limit and least recently
+used eviction. Walls that can't be reproduced (WILD without a seed, or with a time
+budget) are generated every time.
+"""
+import hashlib
+import json
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import OrderedDict
+
+import wall_engine
+from wall_engine import DEFAULT_CATALOGUE, BondType, Corner, Opening, Wall, generate_wall
+
+CACHE_FORMAT_VERSION = 5
+WALL_MAGIC = b'BLWC'
+HEADER_LENGTH = struct.Struct('<4sI')
+
+# Generation options with the defaults generate_wall uses
+DEFAULT_OPTIONS = {
+    'width_mm': wall_engine.WALL_WIDTH,
+    'height_mm': wall_engine.WALL_HEIGHT,
+    'bond_type': BondType.NORMAL,
+    'seed': None,
+    'stride_width': wall_engine.STRIDE_WIDTH,
+    'stride_height': wall_engine.STRIDE_HEIGHT,
+    'solver': "greedy",
+    'beam_width': 16,
+    'time_budget': None,
+    'planner': "grid",
+    'objective': "moves",
+    'reach_margin': wall_engine.REACH_MARGIN,
+    'instrument': False,
+    'openings': (),
+    'catalogue': None,
+    'course_offset': 0,
+    'corners': (None, None),
+}
+
+def _canonical_options(options):
+    unknown = set(options) - set(DEFAULT_OPTIONS)
+    if unknown:
+        raise TypeError(f"Unknown wall options {sorted(unknown)}")
+    canonical = {**DEFAULT_OPTIONS, **options}
+    if canonical['bond_type'] != BondType.WILD:
+        # Only WILD walls depend on the seed and the WILD solver
+        for key in ('seed', 'solver', 'beam_width', 'time_budget'):
+            canonical[key] = DEFAULT_OPTIONS[key]
+    return canonical
+
+def is_cacheable(**options):
+    options = _canonical_options(options)
+    if options['bond_type'] != BondType.WILD:
+        return True
+    return options['seed'] is not None and options['time_budget'] is None
+
+def wall_cache_key(**options):
+    """Hash of everything that determines a generated wall"""
+    options = _canonical_options(options)
+    options['bond_type'] = options['bond_type'].name
+    options.pop('time_budget')
+    options.pop('instrument')
+    options['openings'] = sorted(list(Opening(*opening)) for opening in options['openings'])
+    catalogue = options['catalogue'] if options['catalogue'] is not None else DEFAULT_CATALOGUE
+    options['catalogue'] = catalogue.as_dict()
+    options['course_offset'] %= 2
+    options['corners'] = [None if corner is None else list(Corner(*corner)) for corner in options['corners']]
+    key_data = {'version': CACHE_FORMAT_VERSION, 'options': options}
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+def encode_wall(wall):
+    """Serialize the bricks, joints, build order and brick tallies of a wall into bytes"""
+    columns = wall.bricks.columns() + (wall.build_order, wall.course_counts, wall.stride_counts)
+    header = {
+        'version': CACHE_FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'layer_starts': [layer.start for layer in wall.layers] + [len(wall.bricks)],
+        'joint_positions': [[layer, joints] for layer, joints in wall.joint_positions.items()],
+        'problematic_joints': [[layer, joints] for layer, joints in wall.problematic_joints.items()],
+        'columns': [[column.typecode, len(column)] for column in columns],
+    }
+    header_bytes = json.dumps(header).encode()
+    return b''.join([HEADER_LENGTH.pack(WALL_MAGIC, len(header_bytes)), header_bytes]
+                    + [column.tobytes() for column in columns])
+
+def decode_wall(data, **options):
+    """Rebuild a wall generated with options from bytes written by encode_wall"""
+    magic, header_size = HEADER_LENGTH.unpack_from(data)
+    if magic != WALL_MAGIC:
+        raise ValueError("Not a cached wall")
+    offset = HEADER_LENGTH.size
+    header = json.loads(data[offset:offset + header_size])
+    if header['version'] != CACHE_FORMAT_VERSION or header['byteorder'] != sys.byteorder:
+        raise ValueError("Cached wall was written in an incompatible format")
+    offset += header_size
+
+    columns = []
+    for typecode, length in header['columns']:
+        column = array(typecode)
+        size = column.itemsize * length
+        column.frombytes(data[offset:offset + size])
+        offset += size
+        columns.append(column)
+
+    wall = Wall(**{**options, 'time_budget': None})
+    bricks = wall.bricks
+    (bricks.x_tenths, bricks.y_tenths, bricks.type_code, bricks.layer,
+     bricks.stride, bricks.build_rank, wall.build_order, bricks.course_counts, wall.stride_counts) = columns
+    starts = header['layer_starts']
+    wall.layers = [range(start, stop) for start, stop in zip(starts, starts[1:])]
+    for layer, joints in header['joint_positions']:
+        wall.joint_positions[layer] = joints
+        wall.joint_index[layer] = set(joints)
+    for layer, joints in header['problematic_joints']:
+        wall.problematic_joints[layer] = [tuple(joint) for joint in joints]
+    return wall
+
+class WallCache:
+    """Two level LRU cache of encoded walls: in memory, and in a directory if one is given.
+
+    Several processes can share a cache directory: files are written atomically, reading
+    a file touches it, and the least recently touched files are evicted first.
+    """
+
+    def __init__(self, directory=None, max_memory_bytes=64 * 2**20, max_disk_bytes=1024 * 2**20):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.wall")
+
+    def get(self, key):
+        """Encoded wall stored under key, or None"""
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.hits += 1
+            return data
+        if self.directory is not None:
+            try:
+                with open(self._path(key), 'rb') as file:
+                    data = file.read()
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                self.hits += 1
+                return data
+        self.misses += 1
+        return None
+
+    def put(self, key, data):
+        self._remember(key, data)
+        if self.directory is not None:
+            file_descriptor, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(file_descriptor, 'wb') as file:
+                file.write(data)
+            os.replace(temporary_path, self._path(key))
+            self._evict_disk()
+
+    def _remember(self, key, data):
+        if len(data) > self.max_memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith('.wall'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+_process_caches = {}  # {directory: WallCache} of this process, see process_cache
+
+def process_cache(directory):
+    """The WallCache of this process for a directory, created on first use.
+
+    Workers of a process pool plan many walls each. Sharing one cache per process
+    keeps its memory level warm from one wall to the next, instead of reading the
+    directory again for every hit.
+    """
+    cache = _process_caches.get(directory)
+    if cache is None:
+        cache = _process_caches[directory] = WallCache(directory)
+    return cache
+
+def cached_generate_wall(cache, **options):
+    """generate_wall that returns a copy of a cached wall when the same wall was generated before"""
+    if cache is None or not is_cacheable(**options):
+        return generate_wall(**options)
+    key = wall_cache_key(**options)
+    data = cache.get(key)
+    if data is not None:
+        return decode_wall(data, **options)
+    wall = generate_wall(**options)
+    cache.put(key, encode_wall(wall))
+    return wall
+
+def generate_encoded_wall(cache_dir=None, **options):
+    """cached_generate_wall for worker processes, with a cache in cache_dir if given.
+
+    Returns the wall encoded, which is much cheaper to send back to the parent
+    process than a Wall; decode_wall(data, **options) rebuilds it there.
+    """
+    cache = process_cache(cache_dir) if cache_dir is not None else None
+    return encode_wall(cached_generate_wall(cache, **options))
@@ -0,0 +1,1493 @@
+import json
+import logging
+import math
+import os
+import random
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from functools import lru_cache
+from heapq import heappop, heappush
+from itertools import accumulate
+import time
+
+logger = logging.getLogger(__name__)
+
+# Brick and wall dimensions, in mm
+FULL_BRICK_LENGTH = 210
+DRIEKLEZOOR_LENGTH = 155
+HALF_BRICK_LENGTH = 100
+FULL_BRICK_WIDTH = 100
+BRICK_HEIGHT = 50
+HEAD_JOINT = 10  # Vertical joint
+BED_JOINT = 12.5  # Horizontal joint
+COURSE_HEIGHT = BRICK_HEIGHT + BED_JOINT  # 62.5mm
+
+WALL_WIDTH = 2300
+WALL_HEIGHT = 2000
+
+STRIDE_WIDTH = 800
+STRIDE_HEIGHT = 1300
+
+# Wild bond rules
+MAX_CONSECUTIVE_HALF_BRICKS = 3
+MAX_CONSECUTIVE_FULL_BRICKS = 5
+MAX_PATTERN_LENGTH = 6
+PATTERN_TYPES = ("falling_teeth", "staggering_left", "staggering_right")
+
+WILD_SOLVERS = ("greedy", "beam")
+
+# Build order planners, see plan_build_order
+BUILD_PLANNERS = ("grid", "reach")
+PLANNER_OBJECTIVES = ("moves", "travel")
+# How far past its stride the robot can lay a brick, measured to the brick centre
+REACH_MARGIN = FULL_BRICK_LENGTH + HEAD_JOINT
+
+# Layout and pattern logic works in integer tenths of a millimetre, so positions and
+# joints compare exactly whatever the dimensions. Only the renderer converts to pixels.
+TENTHS_PER_MM = 10
+
+def to_tenths(value_mm):
+    """A length in mm as a whole number of tenths of a millimetre"""
+    return round(value_mm * TENTHS_PER_MM)
+
+def to_mm(tenths):
+    """A length in tenths back in mm, as an int when it is a whole number of mm"""
+    return tenths // TENTHS_PER_MM if tenths % TENTHS_PER_MM == 0 else tenths / TENTHS_PER_MM
+
+class BrickType(Enum):
+    FULL = 1
+    HALF = 2
+    DRIEKLEZOOR = 3
+
+class BondType(Enum):
+    NORMAL = 1
+    FLEMISH = 2
+    WILD = 3
+
+BRICK_LENGTHS = {
+    BrickType.FULL: FULL_BRICK_LENGTH,
+    BrickType.HALF: HALF_BRICK_LENGTH,
+    BrickType.DRIEKLEZOOR: DRIEKLEZOOR_LENGTH,
+}
+
+# Brick lengths indexed by BrickType value, for the type codes stored in a BrickTable
+BRICK_LENGTHS_BY_CODE = (0, FULL_BRICK_LENGTH, HALF_BRICK_LENGTH, DRIEKLEZOOR_LENGTH)
+TYPE_CODE_COUNT = len(BRICK_LENGTHS_BY_CODE)  # Slots per brick tally, indexed by type code like the lengths
+
+class BrickCatalogue:
+    """Brick and joint dimensions in mm, the module constants are the default catalogue.
+
+    The fields keep the mm values they were given. The layout uses the *_tenths
+    attributes, lengths_tenths and lengths_by_code, which are integer tenths of a mm;
+    dimensions finer than a tenth of a mm are rejected.
+    """
+
+    FIELDS = ('full_length', 'half_length', 'drieklezoor_length', 'width', 'height', 'head_joint', 'bed_joint')
+
+    def __init__(self, full_length=FULL_BRICK_LENGTH, half_length=HALF_BRICK_LENGTH,
+                 drieklezoor_length=DRIEKLEZOOR_LENGTH, width=FULL_BRICK_WIDTH, height=BRICK_HEIGHT,
+                 head_joint=HEAD_JOINT, bed_joint=BED_JOINT):
+        if not 0 < half_length < drieklezoor_length < full_length:
+            raise ValueError("Brick lengths must satisfy 0 < half < drieklezoor < full")
+        self.full_length = full_length
+        self.half_length = half_length
+        self.drieklezoor_length = drieklezoor_length
+        self.width = width
+        self.height = height
+        self.head_joint = head_joint
+        self.bed_joint = bed_joint
+        self.course_height = height + bed_joint
+
+        for name in self.FIELDS:
+            value = getattr(self, name)
+            if abs(to_tenths(value) - value * TENTHS_PER_MM) > 1e-6:
+                raise ValueError(f"{name} of {value} mm is not a whole number of tenths of a mm")
+        self.full_tenths = to_tenths(full_length)
+        self.half_tenths = to_tenths(half_length)
+        self.drieklezoor_tenths = to_tenths(drieklezoor_length)
+        self.head_joint_tenths = to_tenths(head_joint)
+        self.height_tenths = to_tenths(height)
+        self.course_height_tenths = to_tenths(height) + to_tenths(bed_joint)
+        self.lengths_tenths = {
+            BrickType.FULL: self.full_tenths,
+            BrickType.HALF: self.half_tenths,
+            BrickType.DRIEKLEZOOR: self.drieklezoor_tenths,
+        }
+        self.lengths_by_code = (0, self.full_tenths, self.half_tenths, self.drieklezoor_tenths)
+        # Horizontal step between the joints of a WILD pattern, from one course to the next
+        self.pattern_offset_tenths = self.drieklezoor_tenths - self.half_tenths
+        # Room the end of an adjoining wall's brick takes at a corner
+        self.corner_tenths = to_tenths(width) + self.head_joint_tenths
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __eq__(self, other):
+        return isinstance(other, BrickCatalogue) and self.as_dict() == other.as_dict()
+
+    def __hash__(self):
+        return hash(tuple(self.as_dict().values()))
+
+    def __repr__(self):
+        return f"BrickCatalogue({', '.join(f'{name}={value}' for name, value in self.as_dict().items())})"
+
+DEFAULT_CATALOGUE = BrickCatalogue()
+
+# A rectangle left open in a wall, such as a window or a door, in mm from the bottom left corner
+Opening = namedtuple('Opening', 'x_mm y_mm width_mm height_mm')
+
+# How a wall end meets the wall around a corner: its courses of parity butt_parity, below
+# courses, butt against a brick of the other wall, the other courses run through the corner
+Corner = namedtuple('Corner', 'butt_parity courses')
+
+@lru_cache(maxsize=256)
+def _course_segments(width, openings, bottom, top, min_width):
+    """Stretches of a course between the openings it crosses, see WallSpec.course_segments.
+
+    Everything is in tenths of a mm, openings as (left, bottom, right, top) tuples.
+    """
+    segments = []
+    start = 0
+    for left, opening_bottom, right, opening_top in openings:
+        if opening_bottom >= top or opening_top <= bottom:
+            continue
+        if left - start >= min_width:
+            segments.append((start, left, False))
+        start = max(start, right)
+    if width - start >= min_width:
+        segments.append((start, width, True))
+    return tuple(segments)
+
+class WallSpec:
+    """Geometry of a wall: its size, the openings left in it and the bricks it is built from.
+
+    course_offset swaps the odd and even course rules, so a wall can start its bond on
+    either parity, and corners holds a Corner (or None for a free end) for the start
+    and the end of the wall; see building.py, which derives both for walls that meet.
+    """
+
+    def __init__(self, width_mm=WALL_WIDTH, height_mm=WALL_HEIGHT, openings=(), catalogue=None,
+                 course_offset=0, corners=(None, None)):
+        self.width_mm = width_mm
+        self.height_mm = height_mm
+        self.openings = tuple(sorted(Opening(*opening) for opening in openings))
+        for opening in self.openings:
+            if opening.width_mm <= 0 or opening.height_mm <= 0:
+                raise ValueError(f"Openings need a positive size: {opening}")
+        self.catalogue = catalogue if catalogue is not None else DEFAULT_CATALOGUE
+        self.course_offset = course_offset % 2
+        if len(corners) != 2:
+            raise ValueError("corners holds one Corner or None for each end of the wall")
+        self.corners = tuple(None if corner is None else Corner(*corner) for corner in corners)
+        self.width_tenths = to_tenths(width_mm)
+        self.height_tenths = to_tenths(height_mm)
+        self._opening_edges = tuple(
+            (to_tenths(o.x_mm), to_tenths(o.y_mm), to_tenths(o.x_mm + o.width_mm), to_tenths(o.y_mm + o.height_mm))
+            for o in self.openings
+        )
+
+    @property
+    def num_layers(self):
+        return self.height_tenths // self.catalogue.course_height_tenths
+
+    def is_odd_course(self, layer):
+        """Whether a course is laid by the odd course rules"""
+        return (layer + self.course_offset) % 2 == 1
+
+    def butt_ends(self, layer):
+        """Whether a course butts against the adjoining wall at the start and at the end of the wall"""
+        return tuple(corner is not None and layer < corner.courses and layer % 2 == corner.butt_parity
+                     for corner in self.corners)
+
+    def course_segments(self, layer):
+        """(start, end, ends_at_wall_end) in tenths of a mm of every stretch of brickwork in a course.
+
+        A course is split wherever an opening overlaps its bricks. Stretches beside an
+        opening that are narrower than a full brick can't be bonded and are left empty.
+        Segments are cached per course band, so the courses beside a row of windows
+        share them.
+        """
+        catalogue = self.catalogue
+        bottom = layer * catalogue.course_height_tenths
+        if not self.openings:
+            return ((0, self.width_tenths, True),) if self.width_tenths > 0 else ()
+        return _course_segments(self.width_tenths, self._opening_edges, bottom, bottom + catalogue.height_tenths,
+                                catalogue.full_tenths)
+
+    def replace(self, **changes):
+        """Copy of this spec with some of its fields changed"""
+        fields = {'width_mm': self.width_mm, 'height_mm': self.height_mm,
+                  'openings': self.openings, 'catalogue': self.catalogue,
+                  'course_offset': self.course_offset, 'corners': self.corners}
+        return WallSpec(**{**fields, **changes})
+
+    def _key(self):
+        return (self.width_mm, self.height_mm, self.openings, self.catalogue, self.course_offset, self.corners)
+
+    def __eq__(self, other):
+        return isinstance(other, WallSpec) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def __repr__(self):
+        return (f"WallSpec(width_mm={self.width_mm}, height_mm={self.height_mm}, "
+                f"openings={list(self.openings)}, catalogue={self.catalogue}, "
+                f"course_offset={self.course_offset}, corners={self.corners})")
+
+class BrickTable:
+    """Struct-of-arrays brick storage, row i holds the brick with id i.
+
+    Positions and lengths are integer tenths of a mm, x_mm, y_mm and width_mm
+    convert a single brick to mm.
+    """
+
+    def __init__(self, lengths_by_code=DEFAULT_CATALOGUE.lengths_by_code):
+        self.lengths_by_code = lengths_by_code  # Brick length in tenths per type code, from the wall's catalogue
+        self.x_tenths = array('i')
+        self.y_tenths = array('i')
+        self.type_code = array('B')  # BrickType value
+        self.layer = array('i')
+        self.stride = array('i')  # Stride index, filled in by calculate_build_order
+        self.build_rank = array('i')  # Position in the build order, filled in by calculate_build_order
+        # Bricks per type code of every course, layer * TYPE_CODE_COUNT + type code, tallied as bricks are added
+        self.course_counts = array('I')
+
+    def __len__(self):
+        return len(self.x_tenths)
+
+    def add(self, x, y, brick_type, layer):
+        """Append a brick at (x, y) in tenths of a mm and return its id"""
+        self.x_tenths.append(x)
+        self.y_tenths.append(y)
+        self.type_code.append(brick_type.value)
+        self.layer.append(layer)
+        self.stride.append(-1)
+        self.build_rank.append(-1)
+        self.course_counts[TYPE_CODE_COUNT * layer + brick_type.value] += 1
+        return len(self.x_tenths) - 1
+
+    def add_course(self, xs, y, type_codes, layer):
+        """Append a whole course at once from arrays of x positions and type codes"""
+        count = len(xs)
+        self.x_tenths.extend(xs)
+        self.y_tenths.extend(array('i', [y]) * count)
+        self.type_code.extend(type_codes)
+        self.layer.extend(array('i', [layer]) * count)
+        self.stride.extend(array('i', [-1]) * count)
+        self.build_rank.extend(array('i', [-1]) * count)
+        course_counts = self.course_counts
+        offset = TYPE_CODE_COUNT * layer
+        for code in type_codes:
+            course_counts[offset + code] += 1
+
+    def start_course(self, layer):
+        """Zero the tally of a course, before its bricks are added"""
+        course_counts = self.course_counts
+        offset = TYPE_CODE_COUNT * layer
+        if len(course_counts) < offset + TYPE_CODE_COUNT:
+            course_counts.extend((0,) * (offset + TYPE_CODE_COUNT - len(course_counts)))
+        course_counts[offset:offset + TYPE_CODE_COUNT] = array('I', [0]) * TYPE_CODE_COUNT
+
+    def truncate(self, size):
+        """Drop every brick with an id of size or higher"""
+        for column in self.columns():
+            del column[size:]
+
+    def columns(self):
+        return (self.x_tenths, self.y_tenths, self.type_code, self.layer, self.stride, self.build_rank)
+
+    def brick_type(self, brick_id):
+        return BrickType(self.type_code[brick_id])
+
+    def width_tenths(self, brick_id):
+        return self.lengths_by_code[self.type_code[brick_id]]
+
+    def x_mm(self, brick_id):
+        return to_mm(self.x_tenths[brick_id])
+
+    def y_mm(self, brick_id):
+        return self.y_tenths[brick_id] / TENTHS_PER_MM
+
+    def width_mm(self, brick_id):
+        return to_mm(self.width_tenths(brick_id))
+
+    def brick(self, brick_id):
+        """Dictionary view of a single brick, for callers that don't need the columns"""
+        return {
+            'id': brick_id,
+            'type': self.brick_type(brick_id),
+            'x_mm': self.x_mm(brick_id),
+            'y_mm': self.y_mm(brick_id),
+            'width_mm': self.width_mm(brick_id),
+            'layer': self.layer[brick_id],
+            'stride': self.stride[brick_id],
+            'build_rank': self.build_rank[brick_id],
+        }
+
+    def nbytes(self):
+        return sum(column.itemsize * len(column) for column in self.columns())
+
+class WallStats:
+    """Timers and counters of the work done generating and planning one wall.
+
+    Phases are always timed. The pattern checks run tens of thousands of times per
+    wall, so their timer and counters are only kept when detailed is set. Timers are
+    inclusive: pattern_checks and trace_pattern_joints are also part of
+    generate_bond_layer.
+    """
+
+    COUNTERS = ('candidates_evaluated', 'pattern_checks', 'chain_lookups', 'joints_scanned', 'problematic_marks')
+
+    def __init__(self, detailed=False):
+        self.detailed = detailed
+        self.timers = {}  # {phase: seconds}
+        self.calls = {}  # {phase: number of timed calls}
+        self.candidates_evaluated = 0  # Brick choices scored by the WILD generators
+        self.pattern_checks = 0  # check_pattern_type calls, detailed only
+        self.chain_lookups = 0  # Joint chains followed by _chain_length, detailed only
+        self.joints_scanned = 0  # Joint lookups following chains (detailed only) and tracing patterns
+        self.problematic_marks = 0  # mark_problematic_joint calls
+
+    def add_time(self, phase, seconds):
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def as_dict(self):
+        return {
+            'detailed': self.detailed,
+            'timers_s': {phase: round(seconds, 6) for phase, seconds in self.timers.items()},
+            'calls': dict(self.calls),
+            'counters': {name: getattr(self, name) for name in self.COUNTERS},
+            'joints_scanned_per_lookup': round(self.joints_scanned / self.chain_lookups, 3) if self.chain_lookups else 0,
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.as_dict(), **kwargs)
+
+class Wall:
+    """All state of one generated wall, so several walls can be planned side by side"""
+
+    def __init__(self, width_mm=WALL_WIDTH, height_mm=WALL_HEIGHT, bond_type=BondType.NORMAL, seed=None,
+                 stride_width=STRIDE_WIDTH, stride_height=STRIDE_HEIGHT,
+                 solver="greedy", beam_width=16, time_budget=None,
+                 planner="grid", objective="moves", reach_margin=REACH_MARGIN, instrument=False,
+                 openings=(), catalogue=None, course_offset=0, corners=(None, None)):
+        if solver not in WILD_SOLVERS:
+            raise ValueError(f"Unknown WILD solver: {solver}")
+        if planner not in BUILD_PLANNERS:
+            raise ValueError(f"Unknown build planner: {planner}")
+        if objective not in PLANNER_OBJECTIVES:
+            raise ValueError(f"Unknown planner objective: {objective}")
+        self.spec = WallSpec(width_mm, height_mm, openings, catalogue, course_offset, corners)
+        self.bond_type = bond_type
+        # Without a seed pick one, so every wall can be re-created from wall.seed
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        self.stride_width = stride_width
+        self.stride_height = stride_height
+        self.rng = random.Random(seed)
+
+        # WILD solver settings, the time budget in seconds covers the whole wall
+        self.solver = solver
+        self.beam_width = beam_width
+        self.solver_deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+        # Build order planner settings
+        self.planner = planner
+        self.objective = objective
+        self.reach_margin = reach_margin
+
+        self.bricks = BrickTable(self.catalogue.lengths_by_code)
+        self.layers = []  # Range of brick ids per course
+        self.joint_positions = {}  # {layer: [joint_pos]} in tenths of a mm, sorted left to right
+        self.joint_index = {}  # {layer: {joint_pos}} for O(1) joint lookups
+        self.pattern_runs = {}  # Memoized pattern run lengths {layer: {chain: run}}, see _chain_length
+        self.problematic_joints = {}  # Joints with long patterns {layer: [(joint_pos, pattern_type)]}
+        self.problematic_origins = {}  # Problematic joints added while checking a layer {layer: [(layer, joint_info)]}
+        self.rng_states = {}  # Random state at the start of each WILD layer, for regeneration
+        self.build_order = array('i')  # Brick ids in build order
+        # Bricks per type code of every stride, stride * TYPE_CODE_COUNT + type code, tallied by the planners
+        self.stride_counts = array('I')
+        self.stats = WallStats(detailed=instrument)  # See WallStats, instrument also counts the pattern checks
+
+    @property
+    def problematic_joint_count(self):
+        return sum(len(joints) for joints in self.problematic_joints.values())
+
+    @property
+    def course_counts(self):
+        """Bricks per type code of every course, see BrickTable.course_counts"""
+        return self.bricks.course_counts
+
+    @property
+    def width_mm(self):
+        return self.spec.width_mm
+
+    @property
+    def height_mm(self):
+        return self.spec.height_mm
+
+    @property
+    def openings(self):
+        return self.spec.openings
+
+    @property
+    def catalogue(self):
+        return self.spec.catalogue
+
+    @property
+    def num_layers(self):
+        return self.spec.num_layers
+
+    @property
+    def horizontal_strides(self):
+        return math.ceil(self.width_mm / self.stride_width)
+
+    @property
+    def vertical_strides(self):
+        return math.ceil(self.height_mm / self.stride_height)
+
+def update_position(x, brick_type, add_joint=True, catalogue=DEFAULT_CATALOGUE):
+    """Position in tenths of a mm after laying a brick at x"""
+    x += catalogue.lengths_tenths[brick_type]
+
+    # Add joint if needed
+    if add_joint:
+        x += catalogue.head_joint_tenths
+
+    return x
+
+# Periodic course layouts as (first bricks, repeating bricks, end brick, end inclusive, closer, closer must fit):
+# the row ends once the remaining width drops below (or to) the length of the end brick,
+# and the closer is laid if it fits or, at the end of the wall, if it doesn't have to.
+COURSE_RULES = {
+    # Normal bond: full bricks, odd layers start with a half brick, a half brick closes the row
+    (BondType.NORMAL, False): ((), (BrickType.FULL,), BrickType.FULL, False, BrickType.HALF, True),
+    (BondType.NORMAL, True): ((BrickType.HALF,), (BrickType.FULL,), BrickType.FULL, False, BrickType.HALF, True),
+    # Flemish bond: even layers start with a drieklezoor and close with a full brick, odd layers the other way round
+    (BondType.FLEMISH, False): ((BrickType.DRIEKLEZOOR,), (BrickType.FULL, BrickType.HALF), BrickType.FULL, True, BrickType.FULL, False),
+    (BondType.FLEMISH, True): ((BrickType.FULL,), (BrickType.HALF, BrickType.FULL), BrickType.DRIEKLEZOOR, True, BrickType.DRIEKLEZOOR, False),
+}
+
+def _corner_brick(bond_type, is_odd_layer):
+    """Brick a course starts with at the start of the wall"""
+    if bond_type == BondType.WILD:
+        return BrickType.HALF if is_odd_layer else BrickType.DRIEKLEZOOR
+    lead, period = COURSE_RULES[(bond_type, is_odd_layer)][:2]
+    return (lead or period)[0]
+
+@lru_cache(maxsize=256)
+def _course_layout(bond_type, is_odd_layer, width, catalogue=DEFAULT_CATALOGUE, at_opening=False):
+    """Brick type codes, x offsets and joint positions of a periodic course, in tenths of a mm.
+
+    Whole periods that cannot reach the end of the row are counted in closed form,
+    only the last few bricks are stepped through. Offsets are cumulative sums of the
+    brick pitches. A row that ends at an opening only gets a closer that fits. The
+    returned arrays are shared, callers must copy them.
+    """
+    lead, period, end_brick, end_inclusive, closer, closer_must_fit = COURSE_RULES[(bond_type, is_odd_layer)]
+    lengths = catalogue.lengths_tenths
+    head_joint = catalogue.head_joint_tenths
+    end_length = lengths[end_brick]
+    closer_min = lengths[closer] if closer_must_fit or at_opening else 0
+    types = list(lead) if width > 0 else []
+    x = sum(lengths[t] + head_joint for t in types)
+
+    # Every full period is safe while the brick at its end still leaves more than the end length
+    period_pitch = sum(lengths[t] + head_joint for t in period)
+    last_brick_offset = period_pitch - (lengths[period[-1]] + head_joint)
+    slack = width - x - last_brick_offset - end_length
+    whole_periods = max(0, -(-slack // period_pitch))
+    types.extend(period * whole_periods)
+    x += whole_periods * period_pitch
+
+    # Step through the end of the row
+    brick_count = 0
+    while x < width:
+        remaining_width = width - x
+        if remaining_width < end_length or (end_inclusive and remaining_width == end_length):
+            if remaining_width >= closer_min:
+                types.append(closer)
+            break
+        brick_type = period[brick_count % len(period)]
+        types.append(brick_type)
+        x += lengths[brick_type] + head_joint
+        brick_count += 1
+
+    brick_lengths = [lengths[t] for t in types]
+    offsets = array('i', accumulate((length + head_joint for length in brick_lengths), initial=0))[:-1]
+    joints = [offset + length for offset, length in zip(offsets, brick_lengths)]
+    return array('B', [t.value for t in types]), offsets, joints
+
+def generate_bond_layer(wall, layer):
+    start = time.perf_counter()
+    # Reset the joints of this layer, run lengths through this layer are stale as well
+    joint_positions = wall.joint_positions
+    joint_positions[layer] = []
+    wall.joint_index.pop(layer, None)
+    for stale_layer in [l for l in wall.pattern_runs if l >= layer]:
+        del wall.pattern_runs[stale_layer]
+
+    # Calculate position values
+    spec = wall.spec
+    catalogue = spec.catalogue
+    y = layer * catalogue.course_height_tenths
+    is_odd_layer = spec.is_odd_course(layer)
+    bond_type = wall.bond_type
+    butt_start, butt_end = spec.butt_ends(layer)
+
+    bricks = wall.bricks
+    first_id = len(bricks)
+    bricks.start_course(layer)
+
+    # Remember the random state, regenerating from this layer has to make the same choices
+    if bond_type == BondType.WILD:
+        wall.rng_states[layer] = wall.rng.getstate()
+
+    # Openings split the course into segments, each laid out as a row with its own corners
+    for segment_start, segment_end, at_wall_end in spec.course_segments(layer):
+        # At a corner the other wall's brick takes the place of a half brick at the start
+        # of the course, any other first brick moves past it. At the end the course stops short
+        skip_corner = False
+        if butt_start and segment_start == 0:
+            if _corner_brick(bond_type, is_odd_layer) == BrickType.HALF:
+                skip_corner = True
+            else:
+                segment_start = catalogue.corner_tenths
+        if butt_end and at_wall_end:
+            segment_end -= catalogue.corner_tenths
+            at_wall_end = False
+        if (butt_start or butt_end) and segment_end - segment_start < catalogue.full_tenths:
+            continue
+
+        if bond_type == BondType.NORMAL or bond_type == BondType.FLEMISH:
+            # Normal and flemish courses only depend on the parity of the layer and the
+            # width of the segment, so they are laid out once
+            type_codes, offsets, joints = _course_layout(bond_type, is_odd_layer, segment_end - segment_start,
+                                                         catalogue, not at_wall_end)
+            if skip_corner:
+                type_codes, offsets = type_codes[1:], offsets[1:]
+            if segment_start:
+                offsets = array('i', [offset + segment_start for offset in offsets])
+                joints = [joint + segment_start for joint in joints]
+            bricks.add_course(offsets, y, type_codes, layer)
+            joint_positions[layer].extend(joints)
+
+        elif bond_type == BondType.WILD and wall.solver == "beam":
+            # Wild bond pattern, searching the whole segment instead of one brick at a time
+            _generate_wild_layer_beam(wall, layer, y, segment_start, segment_end, skip_corner)
+
+        elif bond_type == BondType.WILD:
+            _generate_wild_segment(wall, layer, y, segment_start, segment_end, skip_corner)
+
+    # Index the finished layer for the pattern checks of the layers above it
+    wall.joint_index[layer] = set(joint_positions[layer])
+    wall.stats.add_time('generate_bond_layer', time.perf_counter() - start)
+    return range(first_id, len(bricks))
+
+def _generate_wild_segment(wall, layer, y, x, end, skip_corner=False):
+    """Lay the WILD bond pattern from x to end (in tenths of a mm), choosing one brick at a time.
+
+    With skip_corner the first brick is left to the adjoining wall, only its joint is kept.
+    """
+    catalogue = wall.catalogue
+    full_length = catalogue.full_tenths
+    half_length = catalogue.half_tenths
+    drieklezoor_length = catalogue.drieklezoor_tenths
+    head_joint = catalogue.head_joint_tenths
+    is_odd_layer = wall.spec.is_odd_course(layer)
+    bricks = wall.bricks
+    joints = wall.joint_positions[layer]
+
+    brick_count = 0
+    consecutive_full_bricks = 0
+    consecutive_half_bricks = 0
+    candidates_evaluated = 0
+
+    while x < end:
+        # First brick in row - corners have special rules
+        if brick_count == 0:
+            if is_odd_layer:
+                # Odd layer starts with HALF brick
+                if not skip_corner:
+                    bricks.add(x, y, BrickType.HALF, layer)
+                x = update_position(x, BrickType.HALF, catalogue=catalogue)
+                consecutive_half_bricks = 1
+                consecutive_full_bricks = 0
+            else:
+                # Even layer starts with DRIEKLEZOOR
+                bricks.add(x, y, BrickType.DRIEKLEZOOR, layer)
+                x = update_position(x, BrickType.DRIEKLEZOOR, catalogue=catalogue)
+                consecutive_half_bricks = 0
+                consecutive_full_bricks = 0
+            # Store the joint position at the end of this brick
+            joints.append(x - head_joint)
+            brick_count += 1
+            continue
+
+        # Calculate remaining width
+        remaining_width = end - x
+
+        # Handle end of row
+        if remaining_width < full_length:
+            # If we're near the end, place the appropriate ending brick
+            if is_odd_layer:
+                # Odd layer (starting with half) should end with drieklezoor if there's room
+                if remaining_width >= drieklezoor_length:
+                    bricks.add(x, y, BrickType.DRIEKLEZOOR, layer)
+                    # Store the joint position at the end of this brick
+                    joints.append(x + drieklezoor_length)
+            else:
+                # Even layer (starting with drieklezoor) should end with half brick if there's room
+                if remaining_width >= half_length:
+                    bricks.add(x, y, BrickType.HALF, layer)
+                    # Store the joint position at the end of this brick
+                    joints.append(x + half_length)
+            break
+
+        # Decide whether to use a full or half brick based on rules
+        use_full_brick = False
+
+        # Check consecutive brick types - these are primary rules
+        if consecutive_half_bricks >= MAX_CONSECUTIVE_HALF_BRICKS:
+            # Rule: max 3 half bricks in a row
+            use_full_brick = True
+        elif consecutive_full_bricks >= MAX_CONSECUTIVE_FULL_BRICKS:
+            # Rule: max 5 full bricks in a row
+            use_full_brick = False
+        else:
+            # Calculate the potential joint positions for both brick types
+            full_joint_pos = x + full_length
+            half_joint_pos = x + half_length
+
+            # Check for vertical staggered patterns (falling teeth pattern across layers)
+            full_pattern_length = 0
+            half_pattern_length = 0
+
+            # We need to check if either joint position would continue a vertical pattern
+            if layer > 0:  # Only check if we have previous layers
+                # Look for patterns in both potential brick placements
+                candidates_evaluated += 2
+                full_pattern_length = check_vertical_pattern(wall, layer, full_joint_pos)
+                half_pattern_length = check_vertical_pattern(wall, layer, half_joint_pos)
+
+            # Always choose the brick type that results in the shortest pattern
+            if full_pattern_length > half_pattern_length:
+                use_full_brick = False  # Use half brick because it creates a shorter pattern
+            elif half_pattern_length > full_pattern_length:
+                use_full_brick = True   # Use full brick because it creates a shorter pattern
+            else:
+                # If both pattern lengths are equal, randomly choose with slight preference for full bricks
+                use_full_brick = wall.rng.random() < 0.6
+
+        # Create the appropriate brick
+        if use_full_brick:
+            bricks.add(x, y, BrickType.FULL, layer)
+            next_joint_pos = x + full_length
+            x = update_position(x, BrickType.FULL, catalogue=catalogue)
+            consecutive_full_bricks += 1
+            consecutive_half_bricks = 0
+        else:
+            bricks.add(x, y, BrickType.HALF, layer)
+            next_joint_pos = x + half_length
+            x = update_position(x, BrickType.HALF, catalogue=catalogue)
+            consecutive_half_bricks += 1
+            consecutive_full_bricks = 0
+
+        # Store the joint position
+        joints.append(next_joint_pos)
+
+        brick_count += 1
+
+    wall.stats.candidates_evaluated += candidates_evaluated
+
+def _solve_wild_course(wall, layer, x, consecutive_full_bricks, consecutive_half_bricks, end):
+    """Beam search over the full/half choices of a WILD course after its corner brick, up to end.
+
+    A state is (score, x in tenths, consecutive full, consecutive half, path), scored by the
+    number of joints continuing a pattern longer than MAX_PATTERN_LENGTH and then by
+    the summed pattern length. States reaching the same position with the same
+    consecutive counts are merged. Once the wall's time budget is spent the beam
+    narrows to one state. Returns the brick types to lay, including the closer.
+    """
+    lengths = wall.catalogue.lengths_tenths
+    full_length = wall.catalogue.full_tenths
+    head_joint = wall.catalogue.head_joint_tenths
+    is_odd_layer = wall.spec.is_odd_course(layer)
+    beam = [((0, 0, 0.0), x, consecutive_full_bricks, consecutive_half_bricks, None)]
+    finished = []
+    candidates_evaluated = 0
+
+    while beam:
+        candidates = {}
+        for score, x, full_count, half_count, path in beam:
+            remaining_width = end - x
+            if remaining_width <= 0:
+                finished.append((score, path))
+                continue
+
+            # End of row, the closer is decided by the corner rules
+            if remaining_width < full_length:
+                if is_odd_layer and remaining_width >= lengths[BrickType.DRIEKLEZOOR]:
+                    path = (BrickType.DRIEKLEZOOR, path)
+                elif not is_odd_layer and remaining_width >= lengths[BrickType.HALF]:
+                    path = (BrickType.HALF, path)
+                finished.append((score, path))
+                continue
+
+            if half_count >= MAX_CONSECUTIVE_HALF_BRICKS:
+                options = (BrickType.FULL,)
+            elif full_count >= MAX_CONSECUTIVE_FULL_BRICKS:
+                options = (BrickType.HALF,)
+            else:
+                options = (BrickType.FULL, BrickType.HALF)
+
+            for brick_type in options:
+                brick_length = lengths[brick_type]
+                length = pattern_length(wall, layer, x + brick_length) if layer > 0 else 0
+                candidates_evaluated += 1
+                new_score = (score[0] + (length > MAX_PATTERN_LENGTH), score[1] + length, wall.rng.random())
+                if brick_type == BrickType.FULL:
+                    state = (new_score, x + brick_length + head_joint, full_count + 1, 0, (brick_type, path))
+                else:
+                    state = (new_score, x + brick_length + head_joint, 0, half_count + 1, (brick_type, path))
+                key = state[1:4]
+                if key not in candidates or new_score < candidates[key][0]:
+                    candidates[key] = state
+
+        beam_width = wall.beam_width
+        if wall.solver_deadline is not None and time.perf_counter() > wall.solver_deadline:
+            beam_width = 1
+        beam = sorted(candidates.values(), key=lambda state: state[0])[:beam_width]
+
+    wall.stats.candidates_evaluated += candidates_evaluated
+    _, path = min(finished, key=lambda state: state[0])
+    brick_types = []
+    while path is not None:
+        brick_type, path = path
+        brick_types.append(brick_type)
+    brick_types.reverse()
+    return brick_types
+
+def _generate_wild_layer_beam(wall, layer, y, x, end, skip_corner=False):
+    """Lay a WILD segment chosen by _solve_wild_course and mark the joints it could not avoid"""
+    catalogue = wall.catalogue
+    bricks = wall.bricks
+    joints = wall.joint_positions[layer]
+    if end <= x:
+        return
+
+    # First brick in row - corners have special rules
+    if wall.spec.is_odd_course(layer):
+        corner_type, consecutive_full_bricks, consecutive_half_bricks = BrickType.HALF, 0, 1
+    else:
+        corner_type, consecutive_full_bricks, consecutive_half_bricks = BrickType.DRIEKLEZOOR, 0, 0
+    if not skip_corner:
+        bricks.add(x, y, corner_type, layer)
+    x = update_position(x, corner_type, catalogue=catalogue)
+    joints.append(x - catalogue.head_joint_tenths)
+
+    brick_types = _solve_wild_course(wall, layer, x, consecutive_full_bricks, consecutive_half_bricks, end)
+    for index, brick_type in enumerate(brick_types):
+        bricks.add(x, y, brick_type, layer)
+        joint_pos = x + catalogue.lengths_tenths[brick_type]
+        joints.append(joint_pos)
+        # The closer is not part of the search, like in the greedy generator
+        is_closer = index == len(brick_types) - 1 and end - x < catalogue.full_tenths
+        if layer > 0 and not is_closer and pattern_length(wall, layer, joint_pos) > MAX_PATTERN_LENGTH:
+            check_vertical_pattern(wall, layer, joint_pos)
+        x = update_position(x, brick_type, catalogue=catalogue)
+
+# Helper function to check for vertical staggered patterns
+def check_vertical_pattern(wall, current_layer, joint_pos):
+    stats = wall.stats
+    if stats.detailed:
+        start = time.perf_counter()
+
+    # Check for falling teeth, staggering left and staggering right patterns
+    teeth_pattern_length = check_pattern_type(wall, current_layer, joint_pos, "falling_teeth")
+    left_pattern_length = check_pattern_type(wall, current_layer, joint_pos, "staggering_left")
+    right_pattern_length = check_pattern_type(wall, current_layer, joint_pos, "staggering_right")
+
+    if stats.detailed:
+        stats.pattern_checks += 3
+        stats.add_time('pattern_checks', time.perf_counter() - start)
+
+    if teeth_pattern_length > MAX_PATTERN_LENGTH:
+        logger.debug("Pattern too long for falling teeth at layer %d, joint %s mm", current_layer, to_mm(joint_pos))
+        mark_problematic_joint(wall, current_layer, joint_pos, "falling_teeth")
+    if left_pattern_length > MAX_PATTERN_LENGTH:
+        logger.debug("Pattern too long for staggering left at layer %d, joint %s mm", current_layer, to_mm(joint_pos))
+        mark_problematic_joint(wall, current_layer, joint_pos, "staggering_left")
+    if right_pattern_length > MAX_PATTERN_LENGTH:
+        logger.debug("Pattern too long for staggering right at layer %d, joint %s mm", current_layer, to_mm(joint_pos))
+        mark_problematic_joint(wall, current_layer, joint_pos, "staggering_right")
+
+    # Return the longest pattern found
+    return max(teeth_pattern_length, left_pattern_length, right_pattern_length)
+
+def pattern_length(wall, current_layer, joint_pos):
+    """Longest pattern continued by a joint, without marking anything"""
+    stats = wall.stats
+    if stats.detailed:
+        start = time.perf_counter()
+    length = max(
+        check_pattern_type(wall, current_layer, joint_pos, "falling_teeth"),
+        check_pattern_type(wall, current_layer, joint_pos, "staggering_left"),
+        check_pattern_type(wall, current_layer, joint_pos, "staggering_right"),
+    )
+    if stats.detailed:
+        stats.pattern_checks += 3
+        stats.add_time('pattern_checks', time.perf_counter() - start)
+    return length
+
+def max_pattern_length(wall):
+    """Longest vertical joint pattern anywhere in the wall.
+
+    The joint after the corner brick and the end of the row are fixed by the bond
+    rules and always line up, so only the joints in between are measured.
+    """
+    return max(
+        (pattern_length(wall, layer, joint) for layer, joints in wall.joint_positions.items() for joint in joints[1:-1]),
+        default=0,
+    )
+
+def mark_problematic_joint(wall, layer, joint_pos, pattern_type):
+    """Mark a joint as part of a problematic pattern and also mark the connected joints in previous layers"""
+    problematic_joints = wall.problematic_joints
+    wall.stats.problematic_marks += 1
+
+    # Initialize the layer in the dictionary if it doesn't exist
+    if layer not in problematic_joints:
+        problematic_joints[layer] = []
+
+    # Add the joint to the problematic joints list if not already there
+    joint_info = (joint_pos, pattern_type)
+    if joint_info not in problematic_joints[layer]:
+        problematic_joints[layer].append(joint_info)
+        wall.problematic_origins.setdefault(layer, []).append((layer, joint_info))
+
+    # Now trace the pattern back and mark all related joints in previous layers
+    start = time.perf_counter()
+    trace_pattern_joints(wall, layer, joint_pos, pattern_type)
+    wall.stats.add_time('trace_pattern_joints', time.perf_counter() - start)
+
+def _first_joint_within(joints, low, high):
+    """First joint of a sorted joint list that lies in [low, high], or None"""
+    i = bisect_left(joints, low)
+    if i < len(joints) and joints[i] <= high:
+        return joints[i]
+    return None
+
+def trace_pattern_joints(wall, current_layer, joint_pos, pattern_type):
+    """Trace the pattern backwards and mark all joints in the problematic pattern"""
+    joint_positions = wall.joint_positions
+    problematic_joints = wall.problematic_joints
+    vertical_offset = wall.catalogue.pattern_offset_tenths
+    max_offset_tolerance = 10 * TENTHS_PER_MM
+
+    current_pos = joint_pos
+    original_pos = joint_pos
+    offset_pos = None
+
+    # Start checking from the current_layer downward
+    for layer_id in range(current_layer-1, -1, -1):
+        if layer_id not in joint_positions:
+            break
+
+        # Joints of a layer are sorted, so the first joint within tolerance is found by bisection
+        joints = joint_positions[layer_id]
+        matched_joint = None
+        wall.stats.joints_scanned += 1
+
+        if pattern_type == "falling_teeth":
+            layer_offset = current_layer - layer_id
+
+            if layer_offset % 2 == 0:
+                # Even offset - should align with original position
+                target = original_pos
+            elif offset_pos is None:
+                # First time we've encountered an odd layer, the offset can be to either side
+                matched_joint = _first_joint_within(
+                    joints,
+                    original_pos - vertical_offset - max_offset_tolerance,
+                    original_pos - vertical_offset + max_offset_tolerance,
+                )
+                if matched_joint is None:
+                    matched_joint = _first_joint_within(
+                        joints,
+                        original_pos + vertical_offset - max_offset_tolerance,
+                        original_pos + vertical_offset + max_offset_tolerance,
+                    )
+                offset_pos = matched_joint
+                target = None
+            else:
+                # Check if this odd layer aligns with previous odd layers
+                target = offset_pos
+
+        elif pattern_type == "staggering_left":
+            # For staggering left, we want negative offset (around -55mm)
+            target = current_pos - vertical_offset
+
+        elif pattern_type == "staggering_right":
+            # For staggering right, we want positive offset (around +55mm)
+            target = current_pos + vertical_offset
+
+        if target is not None:
+            matched_joint = _first_joint_within(joints, target - max_offset_tolerance, target + max_offset_tolerance)
+
+        if matched_joint is not None:
+            current_pos = matched_joint
+            # Mark this joint as problematic
+            if layer_id not in problematic_joints:
+                problematic_joints[layer_id] = []
+            joint_info = (matched_joint, pattern_type)
+            if joint_info not in problematic_joints[layer_id]:
+                problematic_joints[layer_id].append(joint_info)
+                wall.problematic_origins.setdefault(current_layer, []).append((layer_id, joint_info))
+        else:
+            break
+
+    # For falling teeth pattern, we need at least 3 layers to confirm the pattern
+    if pattern_type == "falling_teeth" and len(problematic_joints.get(current_layer, [])) < 2:
+        # Remove the single joint if we don't have enough to confirm the pattern
+        if current_layer in problematic_joints:
+            problematic_joints[current_layer] = [j for j in problematic_joints[current_layer]
+                                              if j[1] != "falling_teeth" or j[0] != joint_pos]
+
+def _chain_length(wall, layer, pos, step, alternate):
+    """Number of consecutive layers, from layer downwards, that continue a joint chain.
+
+    A staggering chain moves step tenths of a mm per layer, an alternating (falling teeth) chain
+    swaps between pos and step. Run lengths are memoized per (layer, joint, chain), so
+    a chain that was measured before is extended instead of walked again.
+    """
+    joint_index = wall.joint_index
+    pattern_runs = wall.pattern_runs
+    path = []
+    length = 0
+    scanned = 0
+
+    while layer >= 0:
+        layer_runs = pattern_runs.get(layer)
+        if layer_runs is None:
+            layer_runs = pattern_runs[layer] = {}
+        key = (pos, step, alternate)
+        cached = layer_runs.get(key)
+        if cached is not None:
+            length = cached
+            break
+        joints = joint_index.get(layer)
+        scanned += 1
+        if joints is None or pos not in joints:
+            layer_runs[key] = 0
+            break
+        path.append((layer_runs, key))
+        if alternate:
+            pos, step = step, pos
+        else:
+            pos += step
+        layer -= 1
+
+    # Fill in the run length of every joint we walked past
+    for layer_runs, key in reversed(path):
+        length += 1
+        layer_runs[key] = length
+
+    stats = wall.stats
+    if stats.detailed:
+        stats.chain_lookups += 1
+        stats.joints_scanned += scanned
+    return length
+
+def check_pattern_type(wall, current_layer, joint_pos, pattern_type):
+    # The offset distance we're looking for between layers, joints are in tenths of a mm
+    vertical_offset = wall.catalogue.pattern_offset_tenths
+
+    if current_layer < 1:
+        return 0
+
+    if pattern_type == "falling_teeth":
+        # The layer below must have a joint at either offset position, the left one wins
+        below = wall.joint_index.get(current_layer - 1, ())
+        if joint_pos - vertical_offset in below:
+            offset_pos = joint_pos - vertical_offset
+        elif joint_pos + vertical_offset in below:
+            offset_pos = joint_pos + vertical_offset
+        else:
+            return 0
+        # From there the chain alternates between the offset and the original position
+        pattern_length = _chain_length(wall, current_layer - 1, offset_pos, joint_pos, True)
+
+        # For falling teeth pattern, we need at least 3 layers to confirm the pattern
+        if pattern_length < 2:
+            return 0
+        return pattern_length
+
+    if pattern_type == "staggering_left":
+        # For staggering left, every layer down is -55mm
+        step = -vertical_offset
+    elif pattern_type == "staggering_right":
+        # For staggering right, every layer down is +55mm
+        step = vertical_offset
+    else:
+        return 0
+
+    return _chain_length(wall, current_layer - 1, joint_pos + step, step, False)
+
+def generate_wall(width_mm=WALL_WIDTH, height_mm=WALL_HEIGHT, bond_type=BondType.NORMAL, seed=None,
+                  stride_width=STRIDE_WIDTH, stride_height=STRIDE_HEIGHT,
+                  solver="greedy", beam_width=16, time_budget=None,
+                  planner="grid", objective="moves", reach_margin=REACH_MARGIN, instrument=False,
+                  openings=(), catalogue=None, course_offset=0, corners=(None, None)):
+    """Generate a wall and its build order without touching any display or module state"""
+    wall = Wall(width_mm, height_mm, bond_type, seed, stride_width, stride_height,
+                solver, beam_width, time_budget, planner, objective, reach_margin, instrument,
+                openings, catalogue, course_offset, corners)
+
+    # Generate each layer, the brick table hands out stable ids
+    for layer in range(wall.num_layers):
+        wall.layers.append(generate_bond_layer(wall, layer))
+
+    # After creating the wall layout, we need to optimize the build order
+    plan_build_order(wall)
+    return wall
+
+def generate_wall_from_spec(spec, bond_type=BondType.NORMAL, seed=None, **options):
+    """generate_wall for the size, openings and bricks of a WallSpec"""
+    return generate_wall(spec.width_mm, spec.height_mm, bond_type, seed, openings=spec.openings,
+                         catalogue=spec.catalogue, course_offset=spec.course_offset, corners=spec.corners, **options)
+
+def _stride_row(wall, layer):
+    # Course centres compared in doubled tenths of a mm, so no rounding is involved
+    course_height = wall.catalogue.course_height_tenths
+    return min((2 * layer + 1) * course_height // (2 * to_tenths(wall.stride_height)), wall.vertical_strides - 1)
+
+#calulate which stride each brick belongs to and sort the bricks in the build order
+def calculate_build_order(wall, from_layer=0):
+    """Assign strides and build ranks. Bricks in stride rows below from_layer keep their place in the order"""
+    start = time.perf_counter()
+    bricks = wall.bricks
+    x_tenths = bricks.x_tenths
+    y_tenths = bricks.y_tenths
+    type_code = bricks.type_code
+    stride = bricks.stride
+    build_rank = bricks.build_rank
+
+    lengths_by_code = bricks.lengths_by_code
+    course_height = wall.catalogue.course_height_tenths
+    # Brick centres are compared in doubled tenths of a mm, so they stay integers
+    double_stride_width = 2 * to_tenths(wall.stride_width)
+    double_stride_height = 2 * to_tenths(wall.stride_height)
+    horizontal_strides = wall.horizontal_strides
+    vertical_strides = wall.vertical_strides
+
+    # Stride rows only depend on the layer, so the rows below the first changed one are a prefix of the order
+    first_layer = min(from_layer, len(wall.layers))
+    first_row = _stride_row(wall, first_layer)
+    while first_layer > 0 and _stride_row(wall, first_layer - 1) == first_row:
+        first_layer -= 1
+    first_id = wall.layers[first_layer].start if first_layer < len(wall.layers) else len(bricks)
+
+    # Bricks per type of every stride, the stride rows from first_row on are counted again
+    # (a new wall height can add or drop stride rows above them)
+    stride_counts = wall.stride_counts
+    del stride_counts[TYPE_CODE_COUNT * first_row * horizontal_strides if first_id else 0:]
+    stride_counts.extend((0,) * (TYPE_CODE_COUNT * horizontal_strides * vertical_strides - len(stride_counts)))
+
+    # Group brick ids by stride in dictionary
+    stride_bricks = {}
+
+    # Assign bricks to strides
+    for brick_id in range(first_id, len(bricks)):
+        # Calculate stride for each brick from the centre of the brick
+        x_stride = (2 * x_tenths[brick_id] + lengths_by_code[type_code[brick_id]]) // double_stride_width
+        y_stride = (2 * y_tenths[brick_id] + course_height) // double_stride_height
+        # A closer can stick out past the wall end, keep it in the last stride instead of dropping it
+        x_stride = min(x_stride, horizontal_strides - 1)
+        y_stride = min(y_stride, vertical_strides - 1)
+        stride_key = (x_stride, y_stride)
+
+        if stride_key not in stride_bricks:
+            stride_bricks[stride_key] = []
+
+        stride_bricks[stride_key].append(brick_id)
+
+        # Store the stride of each brick, the viewer uses this for coloring
+        stride_index = y_stride * horizontal_strides + x_stride
+        stride[brick_id] = stride_index
+        stride_counts[TYPE_CODE_COUNT * stride_index + type_code[brick_id]] += 1
+
+    # Build the optimized order by iterating through strides from bottom to top and left to right
+    build_order = wall.build_order
+    del build_order[first_id:]
+    for v in range(first_row, vertical_strides):
+        for h in range(horizontal_strides):
+            stride_key = (h, v)
+            if stride_key in stride_bricks:
+                # Sort bricks within this stride by vertical, then horizontal position
+                stride_group = stride_bricks[stride_key]
+                stride_group.sort(key=lambda i: (y_tenths[i], x_tenths[i]))
+                # Append the sorted bricks to the optimized build order
+                build_order.extend(stride_group)
+
+    for rank in range(first_id, len(build_order)):
+        build_rank[build_order[rank]] = rank
+    wall.build_order = build_order
+    wall.stats.add_time('calculate_build_order', time.perf_counter() - start)
+    return build_order
+
+def plan_build_order(wall, from_layer=0):
+    """Order the bricks with the wall's planner.
+
+    "grid" assigns every brick to the stride its centre is in, see calculate_build_order.
+    "reach" moves the robot platform between strides itself, see plan_reach_order; it
+    always replans the whole wall.
+    """
+    if wall.planner == "reach":
+        return plan_reach_order(wall)
+    return calculate_build_order(wall, from_layer)
+
+def support_dependencies(wall):
+    """Number of supporting bricks per brick, and the bricks each brick supports.
+
+    A brick rests on every brick of the course below whose length overlaps its own.
+    """
+    bricks = wall.bricks
+    x_tenths = bricks.x_tenths
+    type_code = bricks.type_code
+    lengths_by_code = bricks.lengths_by_code
+    supports = array('i', [0]) * len(bricks)
+    supported = [[] for _ in range(len(bricks))]
+
+    for layer in range(1, len(wall.layers)):
+        below = wall.layers[layer - 1]
+        first_below = below.start
+        for brick_id in wall.layers[layer]:
+            left = x_tenths[brick_id]
+            right = left + lengths_by_code[type_code[brick_id]]
+            # Bricks are stored left to right, skip the ones that end before this brick starts
+            while first_below < below.stop and x_tenths[first_below] + lengths_by_code[type_code[first_below]] <= left:
+                first_below += 1
+            below_id = first_below
+            while below_id < below.stop and x_tenths[below_id] < right:
+                supports[brick_id] += 1
+                supported[below_id].append(brick_id)
+                below_id += 1
+    return supports, supported
+
+def _stride_center(wall, stride):
+    horizontal_strides = wall.horizontal_strides
+    return ((stride % horizontal_strides + 0.5) * wall.stride_width,
+            (stride // horizontal_strides + 0.5) * wall.stride_height)
+
+def _next_sweep_stride(wall, ready_count, position, direction):
+    """Next stride of a serpentine sweep: keep going along the row, turn around at its
+    end and only move up once the row has nothing left to lay"""
+    horizontal_strides = wall.horizontal_strides
+    row, column = divmod(position, horizontal_strides)
+    row_start = row * horizontal_strides
+    for sweep in (direction, -direction):
+        columns = range(column + sweep, horizontal_strides) if sweep > 0 else range(column + sweep, -1, -1)
+        for next_column in columns:
+            if ready_count[row_start + next_column]:
+                return row_start + next_column, sweep
+
+    # Continue in the nearest row above that has work, closest to where the platform is
+    for next_row in range(row, wall.vertical_strides):
+        strides = [s for s in range(next_row * horizontal_strides, (next_row + 1) * horizontal_strides) if ready_count[s]]
+        if strides:
+            return min(strides, key=lambda s: abs(s % horizontal_strides - column)), direction
+    return min(s for s, count in enumerate(ready_count) if count), direction
+
+def _closure_size(stride, ready_bricks, laid, supports, supported, reach):
+    """Number of bricks the platform could lay from stride right now, counting the ones it frees up"""
+    pending = [b for _, _, b in ready_bricks[stride] if not laid[b]]
+    seen = set(pending)
+    missing = {}
+    count = 0
+    while pending:
+        brick_id = pending.pop()
+        count += 1
+        for above_id in supported[brick_id]:
+            left = missing.get(above_id, supports[above_id]) - 1
+            missing[above_id] = left
+            if left == 0 and stride in reach[above_id] and above_id not in seen:
+                seen.add(above_id)
+                pending.append(above_id)
+    return count
+
+def plan_reach_order(wall):
+    """Greedy build order that lays no brick before the bricks it rests on.
+
+    The platform stands at a stride and lays every ready brick whose centre is within
+    reach_margin of that stride, bottom to top and left to right, including bricks that
+    become ready along the way. When nothing is left in reach it moves on: with the
+    "moves" objective to the stride that can lay the most bricks, with the "travel"
+    objective to the next stride of a serpentine sweep along the stride row. The
+    stride column records where the platform stood.
+    """
+    start = time.perf_counter()
+    bricks = wall.bricks
+    x_tenths = bricks.x_tenths
+    y_tenths = bricks.y_tenths
+    type_code = bricks.type_code
+    lengths_by_code = bricks.lengths_by_code
+    course_height = wall.catalogue.course_height_tenths
+    horizontal_strides = wall.horizontal_strides
+    vertical_strides = wall.vertical_strides
+    if not len(bricks) or not horizontal_strides or not vertical_strides:
+        # Nothing to lay and nowhere to stand, like the grid planner gives an empty wall an empty order
+        wall.build_order = array('i')
+        wall.stride_counts = array('I', [0]) * (TYPE_CODE_COUNT * horizontal_strides * vertical_strides)
+        wall.stats.add_time('plan_reach_order', time.perf_counter() - start)
+        return wall.build_order
+    # Brick centres, strides and the margin in doubled tenths of a mm, so they stay integers
+    margin = 2 * to_tenths(wall.reach_margin)
+    stride_width = 2 * to_tenths(wall.stride_width)
+    stride_height = 2 * to_tenths(wall.stride_height)
+
+    # The strides every brick can be laid from
+    reach = []
+    for brick_id in range(len(bricks)):
+        center_x = 2 * x_tenths[brick_id] + lengths_by_code[type_code[brick_id]]
+        center_y = 2 * y_tenths[brick_id] + course_height
+        first_h = min(max(0, -(-(center_x - margin) // stride_width) - 1), horizontal_strides - 1)
+        last_h = max(min(horizontal_strides - 1, (center_x + margin) // stride_width), first_h)
+        v = min(center_y // stride_height, vertical_strides - 1)
+        reach.append(range(v * horizontal_strides + first_h, v * horizontal_strides + last_h + 1))
+
+    supports, supported = support_dependencies(wall)
+    ready_bricks = [[] for _ in range(horizontal_strides * vertical_strides)]  # Heap of (y, x, id) per stride
+    ready_count = [0] * (horizontal_strides * vertical_strides)
+
+    def make_ready(brick_id):
+        for stride in reach[brick_id]:
+            heappush(ready_bricks[stride], (y_tenths[brick_id], x_tenths[brick_id], brick_id))
+            ready_count[stride] += 1
+
+    for brick_id in range(len(bricks)):
+        if supports[brick_id] == 0:
+            make_ready(brick_id)
+
+    laid = bytearray(len(bricks))
+    build_order = array('i')
+    stride_counts = wall.stride_counts = array('I', [0]) * (TYPE_CODE_COUNT * horizontal_strides * vertical_strides)
+    position = 0
+    position_xy = _stride_center(wall, position)
+    direction = 1
+    while len(build_order) < len(bricks):
+        # Pick where the platform goes next
+        if wall.objective == "travel":
+            position, direction = _next_sweep_stride(wall, ready_count, position, direction)
+        else:
+            # Go where the most bricks can be laid, looking no further up than the next row
+            best_key = None
+            row = position // horizontal_strides
+            for stride, count in enumerate(ready_count):
+                if count == 0 or stride // horizontal_strides > row + 1:
+                    continue
+                size = _closure_size(stride, ready_bricks, laid, supports, supported, reach)
+                stride_x, stride_y = _stride_center(wall, stride)
+                key = (-size, math.hypot(stride_x - position_xy[0], stride_y - position_xy[1]), stride)
+                if best_key is None or key < best_key:
+                    best_key = key
+            if best_key is None:
+                # The rows up to the next one have nothing ready (an opening can empty a whole stride
+                # row), move up to the lowest stride with work like the sweep does
+                position = min(stride for stride, count in enumerate(ready_count) if count)
+            else:
+                position = best_key[-1]
+        position_xy = _stride_center(wall, position)
+
+        # Lay everything in reach, bricks freed up by this stride join the heap
+        heap = ready_bricks[position]
+        while heap:
+            brick_id = heappop(heap)[2]
+            if laid[brick_id]:
+                continue
+            laid[brick_id] = 1
+            build_order.append(brick_id)
+            bricks.stride[brick_id] = position
+            stride_counts[TYPE_CODE_COUNT * position + type_code[brick_id]] += 1
+            for stride in reach[brick_id]:
+                ready_count[stride] -= 1
+            for above_id in supported[brick_id]:
+                supports[above_id] -= 1
+                if supports[above_id] == 0:
+                    make_ready(above_id)
+
+    for rank, brick_id in enumerate(build_order):
+        bricks.build_rank[brick_id] = rank
+    wall.build_order = build_order
+    wall.stats.add_time('plan_reach_order', time.perf_counter() - start)
+    return build_order
+
+def build_order_stats(wall):
+    """Platform moves, platform travel in mm and support violations of the wall's build order"""
+    stride = wall.bricks.stride
+    supports, supported = support_dependencies(wall)
+    moves = 0
+    travel_mm = 0.0
+    violations = 0
+    previous = None
+    for brick_id in wall.build_order:
+        if previous is not None and stride[brick_id] != previous:
+            moves += 1
+            from_x, from_y = _stride_center(wall, previous)
+            to_x, to_y = _stride_center(wall, stride[brick_id])
+            travel_mm += math.hypot(to_x - from_x, to_y - from_y)
+        previous = stride[brick_id]
+        if supports[brick_id] > 0:
+            violations += 1
+        for above_id in supported[brick_id]:
+            supports[above_id] -= 1
+    return {'stride_moves': moves, 'travel_mm': travel_mm, 'support_violations': violations}
+
+def brick_counts(wall):
+    """Bricks per BrickType of the whole wall, summed from the course tallies of generate_bond_layer"""
+    course_counts = wall.course_counts
+    return {brick_type: sum(course_counts[brick_type.value::TYPE_CODE_COUNT]) for brick_type in BrickType}
+
+def stride_brick_counts(wall, stride):
+    """Bricks per BrickType laid from a stride, from the tallies of the build order planner"""
+    offset = TYPE_CODE_COUNT * stride
+    return {brick_type: wall.stride_counts[offset + brick_type.value] for brick_type in BrickType}
+
+def iter_build_order(wall):
+    """Yield brick ids in build order while the wall is still being generated.
+
+    Courses are generated one at a time and each stride row is ordered as soon as its
+    last course exists, so the first strides can be built before the rest is planned.
+    A wall that has already been generated is replayed from its build order, as is
+    any wall whose planner needs the whole wall first.
+    """
+    if wall.layers or wall.planner != "grid":
+        if not wall.layers:
+            for layer in range(wall.num_layers):
+                wall.layers.append(generate_bond_layer(wall, layer))
+            plan_build_order(wall)
+        yield from wall.build_order
+        return
+
+    row_start = 0
+    for layer in range(wall.num_layers):
+        wall.layers.append(generate_bond_layer(wall, layer))
+        if layer + 1 < wall.num_layers and _stride_row(wall, layer + 1) == _stride_row(wall, layer):
+            continue
+        first_rank = len(wall.build_order)
+        calculate_build_order(wall, row_start)
+        yield from wall.build_order[first_rank:]
+        row_start = layer + 1
+
+def _truncate_wall(wall, layer):
+    """Throw away every course from layer upwards, together with the state derived from it"""
+    if layer < len(wall.layers):
+        wall.bricks.truncate(wall.layers[layer].start)
+        del wall.layers[layer:]
+
+    del wall.course_counts[TYPE_CODE_COUNT * layer:]
+    for state in (wall.joint_positions, wall.joint_index, wall.pattern_runs):
+        for stale_layer in [l for l in state if l >= layer]:
+            del state[stale_layer]
+
+    # Checks in the removed layers also marked joints below them
+    for origin in [l for l in wall.problematic_origins if l >= layer]:
+        for marked_layer, joint_info in wall.problematic_origins.pop(origin):
+            joints = wall.problematic_joints.get(marked_layer)
+            if joints and joint_info in joints:
+                joints.remove(joint_info)
+    for stale_layer in [l for l in wall.problematic_joints if l >= layer]:
+        del wall.problematic_joints[stale_layer]
+
+def regenerate_wall(wall, from_layer=None, width_mm=None, height_mm=None, bond_type=None):
+    """Regenerate a wall in place from from_layer upwards, keeping the courses below it.
+
+    Without from_layer only what the changes require is regenerated: a new height only
+    adds or drops the top courses, a new width or bond regenerates the whole wall.
+    Courses are regenerated with the random state they were first generated with, so
+    the result matches a fresh wall with the same settings.
+    """
+    old_num_layers = wall.num_layers
+    if from_layer is None:
+        from_layer = old_num_layers
+
+    if width_mm is not None and width_mm != wall.width_mm:
+        wall.spec = wall.spec.replace(width_mm=width_mm)
+        from_layer = 0
+    if bond_type is not None and bond_type != wall.bond_type:
+        wall.bond_type = bond_type
+        from_layer = 0
+    if height_mm is not None:
+        wall.spec = wall.spec.replace(height_mm=height_mm)
+        from_layer = min(from_layer, old_num_layers, wall.num_layers)
+
+    from_layer = max(0, min(from_layer, len(wall.layers)))
+    # A WILD wall that was not generated here (e.g. loaded from a cache) has no random
+    # state to continue from, it can only be regenerated from the bottom
+    if (wall.bond_type == BondType.WILD and from_layer > 0
+            and from_layer not in wall.rng_states and from_layer - 1 not in wall.rng_states):
+        from_layer = 0
+    if from_layer in wall.rng_states:
+        wall.rng.setstate(wall.rng_states[from_layer])
+    elif from_layer == 0:
+        wall.rng.seed(wall.seed)
+    for stale_layer in [l for l in wall.rng_states if l >= from_layer]:
+        del wall.rng_states[stale_layer]
+
+    _truncate_wall(wall, from_layer)
+    for layer in range(from_layer, wall.num_layers):
+        wall.layers.append(generate_bond_layer(wall, layer))
+
+    plan_build_order(wall, from_layer)
+    return wall
+
+def _score_wild_candidate(spec, seed):
+    """Generate one WILD candidate in a worker and return its score, not the wall itself"""
+    wall = Wall(spec.width_mm, spec.height_mm, BondType.WILD, seed, openings=spec.openings, catalogue=spec.catalogue,
+                course_offset=spec.course_offset, corners=spec.corners)
+    for layer in range(wall.num_layers):
+        wall.layers.append(generate_bond_layer(wall, layer))
+    return wall.problematic_joint_count, max_pattern_length(wall)
+
+def generate_best_wild_wall(width_mm=WALL_WIDTH, height_mm=WALL_HEIGHT, candidates=8, seed=None,
+                            criterion="problematic_joints", max_workers=None,
+                            stride_width=STRIDE_WIDTH, stride_height=STRIDE_HEIGHT, openings=(), catalogue=None):
+    """Generate several WILD walls in a process pool and return the best one.
+
+    criterion is "problematic_joints" (fewest problematic joints first) or
+    "max_pattern_length" (shortest longest pattern first); the other metric breaks ties.
+    Candidate seeds are derived from seed, and the returned wall carries its own
+    seed, so the search and the chosen wall can both be reproduced.
+    """
+    if criterion not in ("problematic_joints", "max_pattern_length"):
+        raise ValueError(f"Unknown criterion: {criterion}")
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(64)
+    seed_rng = random.Random(seed)
+    candidate_seeds = [seed_rng.getrandbits(64) for _ in range(candidates)]
+
+    spec = WallSpec(width_mm, height_mm, openings, catalogue)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_workers <= 1 or candidates <= 1:
+        scores = [_score_wild_candidate(spec, s) for s in candidate_seeds]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, candidates)) as executor:
+            scores = list(executor.map(_score_wild_candidate, [spec] * candidates, candidate_seeds))
+
+    def rank(index):
+        problematic_count, longest_pattern = scores[index]
+        if criterion == "max_pattern_length":
+            return (longest_pattern, problematic_count, index)
+        return (problematic_count, longest_pattern, index)
+
+    # Only the winner is regenerated here, which is cheaper than shipping every wall back
+    best = min(range(candidates), key=rank)
+    return generate_wall(width_mm, height_mm, BondType.WILD, candidate_seeds[best], stride_width, stride_height,
+                         openings=openings, catalogue=catalogue)
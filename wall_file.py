@@ -0,0 +1,266 @@
+"""Versioned binary wall files that are read through mmap
+
+A wall file holds a generated wall with its joints and build order in fixed
+little endian sections, so opening one only reads the header and every course,
+stride or brick is paged in when it is first used:
+
+    header          WALL_FILE_HEADER
+    catalogue       CATALOGUE_RECORD, brick and joint dimensions and the number of openings
+    openings        one OPENING_RECORD per opening
+    bricks          one BRICK_RECORD per brick, in id order (so course by course)
+    layer starts    uint32 per layer plus one, first brick id of every course
+    build order     uint32 brick id per brick
+    stride starts   uint32 per stride plus one, offsets into the stride bricks
+    stride bricks   uint32 brick id per brick, stride by stride in build order
+    joint starts    uint32 per layer plus one, offsets into the joints
+    joints          int32 joint position per joint, course by course
+    problematic     one PROBLEMATIC_RECORD per problematic joint
+
+Positions and joints are stored in tenths of a millimetre, like in a BrickTable,
+and read back in mm.
+"""
+import mmap
+import struct
+import sys
+from array import array
+
+from wall_engine import PATTERN_TYPES, TENTHS_PER_MM, BondType, BrickCatalogue, BrickType, Opening, to_mm, to_tenths
+
+WALL_FILE_MAGIC = b'BLWF'
+WALL_FILE_VERSION = 2
+# magic, version, brick record size, bricks, layers, horizontal strides, vertical strides,
+# width, height, stride width, stride height, bond, has seed, seed, joints, problematic joints
+WALL_FILE_HEADER = struct.Struct('<4sHHIIIIiiiiB?6xQII')
+# BrickCatalogue.FIELDS in tenths of a millimetre, number of openings
+CATALOGUE_RECORD = struct.Struct('<7iI')
+# x, y, width, height
+OPENING_RECORD = struct.Struct('<4i')
+# x, y, brick type value, layer, stride, build rank
+BRICK_RECORD = struct.Struct('<iiB3xiii')
+# layer, joint position, index into PATTERN_TYPES
+PROBLEMATIC_RECORD = struct.Struct('<iiB3x')
+
+def _uint32_bytes(values):
+    column = array('I', values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+def _int32_bytes(values):
+    column = array('i', values)
+    if sys.byteorder != 'little':
+        column.byteswap()
+    return column.tobytes()
+
+def _stride_bricks(wall):
+    """Starts and brick ids of every stride, each stride in build order"""
+    stride_count = wall.horizontal_strides * wall.vertical_strides
+    stride = wall.bricks.stride
+    starts = [0] * (stride_count + 1)
+    for brick_id in wall.build_order:
+        starts[stride[brick_id] + 1] += 1
+    for index in range(stride_count):
+        starts[index + 1] += starts[index]
+    fill = starts[:-1]
+    brick_ids = [0] * len(wall.build_order)
+    for brick_id in wall.build_order:
+        brick_stride = stride[brick_id]
+        brick_ids[fill[brick_stride]] = brick_id
+        fill[brick_stride] += 1
+    return starts, brick_ids
+
+def write_wall_file(wall, file):
+    """Write a generated wall to a binary file object and return the number of bytes written"""
+    bricks = wall.bricks
+    if len(wall.build_order) != len(bricks):
+        raise ValueError("Only a wall with a complete build order can be written")
+    seed = wall.seed
+    has_seed = isinstance(seed, int) and 0 <= seed < 2**64
+    joints = [wall.joint_positions.get(layer, ()) for layer in range(len(wall.layers))]
+    joint_starts = [0]
+    for layer_joints in joints:
+        joint_starts.append(joint_starts[-1] + len(layer_joints))
+    problematic = [
+        (layer, joint_pos, PATTERN_TYPES.index(pattern_type))
+        for layer in sorted(wall.problematic_joints)
+        for joint_pos, pattern_type in wall.problematic_joints[layer]
+    ]
+    stride_starts, stride_bricks = _stride_bricks(wall)
+
+    sections = [
+        WALL_FILE_HEADER.pack(
+            WALL_FILE_MAGIC, WALL_FILE_VERSION, BRICK_RECORD.size,
+            len(bricks), len(wall.layers), wall.horizontal_strides, wall.vertical_strides,
+            wall.spec.width_tenths, wall.spec.height_tenths,
+            to_tenths(wall.stride_width), to_tenths(wall.stride_height),
+            wall.bond_type.value, has_seed, seed if has_seed else 0,
+            joint_starts[-1], len(problematic),
+        ),
+        CATALOGUE_RECORD.pack(*(to_tenths(value) for value in wall.catalogue.as_dict().values()), len(wall.openings)),
+        b''.join(OPENING_RECORD.pack(*map(to_tenths, opening)) for opening in wall.openings),
+        b''.join(map(
+            BRICK_RECORD.pack,
+            bricks.x_tenths, bricks.y_tenths, bricks.type_code, bricks.layer, bricks.stride, bricks.build_rank,
+        )),
+        _uint32_bytes([layer.start for layer in wall.layers] + [len(bricks)]),
+        _uint32_bytes(wall.build_order),
+        _uint32_bytes(stride_starts),
+        _uint32_bytes(stride_bricks),
+        _uint32_bytes(joint_starts),
+        _int32_bytes(joint_pos for layer_joints in joints for joint_pos in layer_joints),
+        b''.join(PROBLEMATIC_RECORD.pack(*record) for record in problematic),
+    ]
+    return sum(file.write(section) for section in sections)
+
+def save_wall(wall, path):
+    with open(path, 'wb') as file:
+        return write_wall_file(wall, file)
+
+class WallFile:
+    """Read only view of a wall file, mapped into memory instead of read.
+
+    Opening takes the same time for any wall size; bricks, courses and strides are
+    only read from disk when they are accessed.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        (magic, version, record_size, self.brick_count, self.num_layers,
+         self.horizontal_strides, self.vertical_strides,
+         width, height, stride_width, stride_height,
+         bond_value, has_seed, seed, self.joint_count, self.problematic_count) = \
+            WALL_FILE_HEADER.unpack_from(self._map)
+        if magic != WALL_FILE_MAGIC or version != WALL_FILE_VERSION or record_size != BRICK_RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a version {WALL_FILE_VERSION} wall file")
+        self.width_mm = to_mm(width)
+        self.height_mm = to_mm(height)
+        self.stride_width = to_mm(stride_width)
+        self.stride_height = to_mm(stride_height)
+        self.bond_type = BondType(bond_value)
+        self.seed = seed if has_seed else None
+
+        offset = WALL_FILE_HEADER.size
+        *dimensions, opening_count = CATALOGUE_RECORD.unpack_from(self._map, offset)
+        self.catalogue = BrickCatalogue(*map(to_mm, dimensions))
+        self._lengths_by_code = self.catalogue.lengths_by_code
+        offset += CATALOGUE_RECORD.size
+        self.openings = tuple(
+            Opening(*map(to_mm, OPENING_RECORD.unpack_from(self._map, offset + index * OPENING_RECORD.size)))
+            for index in range(opening_count)
+        )
+        offset += opening_count * OPENING_RECORD.size
+
+        stride_count = self.horizontal_strides * self.vertical_strides
+        self._bricks_offset = offset
+        offset += self.brick_count * BRICK_RECORD.size
+        self._layer_starts = self._uint32_section(offset, self.num_layers + 1)
+        offset += 4 * (self.num_layers + 1)
+        self.build_order = self._uint32_section(offset, self.brick_count)
+        offset += 4 * self.brick_count
+        self._stride_starts = self._uint32_section(offset, stride_count + 1)
+        offset += 4 * (stride_count + 1)
+        self._stride_bricks = self._uint32_section(offset, self.brick_count)
+        offset += 4 * self.brick_count
+        self._joint_starts = self._uint32_section(offset, self.num_layers + 1)
+        offset += 4 * (self.num_layers + 1)
+        self._joints = self._section(offset, self.joint_count, 'i')
+        offset += 4 * self.joint_count
+        self._problematic_offset = offset
+        if len(self._map) < offset + self.problematic_count * PROBLEMATIC_RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is truncated")
+
+    def _section(self, offset, count, typecode):
+        section = self._view[offset:offset + 4 * count]
+        if sys.byteorder == 'little':
+            return section.cast(typecode)
+        # Big endian machines get a swapped copy instead of a view
+        column = array(typecode)
+        column.frombytes(section)
+        column.byteswap()
+        return column
+
+    def _uint32_section(self, offset, count):
+        return self._section(offset, count, 'I')
+
+    def __len__(self):
+        return self.brick_count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        for name in ('_layer_starts', 'build_order', '_stride_starts', '_stride_bricks', '_joint_starts', '_joints'):
+            section = self.__dict__.pop(name, None)
+            if isinstance(section, memoryview):
+                section.release()
+        if hasattr(self, '_view'):
+            self._view.release()
+        self._map.close()
+
+    def brick(self, brick_id):
+        """Dictionary view of a single brick, like BrickTable.brick"""
+        if not 0 <= brick_id < self.brick_count:
+            raise IndexError(brick_id)
+        x_tenths, y_tenths, type_value, layer, stride, build_rank = BRICK_RECORD.unpack_from(
+            self._map, self._bricks_offset + brick_id * BRICK_RECORD.size)
+        return {
+            'id': brick_id,
+            'type': BrickType(type_value),
+            'x_mm': to_mm(x_tenths),
+            'y_mm': y_tenths / TENTHS_PER_MM,
+            'width_mm': to_mm(self._lengths_by_code[type_value]),
+            'layer': layer,
+            'stride': stride,
+            'build_rank': build_rank,
+        }
+
+    def layer(self, layer):
+        """Range of the brick ids in a course"""
+        return range(self._layer_starts[layer], self._layer_starts[layer + 1])
+
+    def course_bricks(self, layer):
+        """(x, width) in tenths of a mm of every brick in a course, left to right"""
+        lengths = self._lengths_by_code
+        start = self._bricks_offset + self._layer_starts[layer] * BRICK_RECORD.size
+        end = self._bricks_offset + self._layer_starts[layer + 1] * BRICK_RECORD.size
+        return [(x_tenths, lengths[type_value])
+                for x_tenths, _, type_value, *_ in BRICK_RECORD.iter_unpack(self._view[start:end])]
+
+    def stride_bricks(self, stride_x, stride_y):
+        """Brick ids of a stride in build order"""
+        stride = stride_y * self.horizontal_strides + stride_x
+        return array('I', self._stride_bricks[self._stride_starts[stride]:self._stride_starts[stride + 1]])
+
+    def joints(self, layer):
+        """Joint positions of a course in millimetres"""
+        return [to_mm(joint) for joint in self._joints[self._joint_starts[layer]:self._joint_starts[layer + 1]]]
+
+    def problematic_joints(self):
+        """Dictionary of layer to (joint position in tenths of a mm, pattern type) like Wall.problematic_joints"""
+        problematic_joints = {}
+        for layer, joint_tenths, pattern_code in PROBLEMATIC_RECORD.iter_unpack(
+                self._view[self._problematic_offset:self._problematic_offset
+                           + self.problematic_count * PROBLEMATIC_RECORD.size]):
+            problematic_joints.setdefault(layer, []).append((joint_tenths, PATTERN_TYPES[pattern_code]))
+        return problematic_joints
+
+    def iter_build_steps(self):
+        """Yield the same records as build_export.iter_build_steps, read from the file"""
+        for sequence, brick_id in enumerate(self.build_order):
+            brick = self.brick(brick_id)
+            stride = brick['stride']
+            yield {
+                'sequence': sequence,
+                'stride_x': stride % self.horizontal_strides,
+                'stride_y': stride // self.horizontal_strides,
+                'type': brick['type'],
+                'x_mm': brick['x_mm'],
+                'y_mm': brick['y_mm'],
+            }